@@ -11,14 +11,17 @@ For inquiries, please contact the author.
 
 # import required libraries
 from psychopy import visual, event, core, data, gui
-from psychopy.hardware import keyboard
-import numpy as np
 import pandas as pd
 import os
+import csv
 from psychopy.monitors import Monitor
 import random  
 from psychopy.iohub import launchHubServer
 import matplotlib.pyplot as plt
+from Exp_cache import load_stimulus_index
+from Exp_assets import stimulus_display
+from Exp_textures import preload_image_stims, log_preload_time, TextScreenCache, composite_frame
+from Exp_response import ResponseCollector
 
 # —————————————————————Record participant information—————————————————-
 expInfo = {'测试时间': data.getDateStr(),
@@ -49,7 +52,12 @@ win = visual.Window(size=[1920, 1080],
 win.setMouseVisible(False)
 monitor = Monitor(name='testMonitor')
 
-#defaultKeyboard = keyboard.Keyboard(backend='iohub')
+# instruction screens are laid out once and then shown as cached images (Exp_textures.py)
+screens = TextScreenCache(win)
+
+# timestamped key responses (Exp_response.py): RTs from the key event, measured against the flip
+space_keys = ResponseCollector(win, ['space'])
+label_keys = ResponseCollector(win, ['left', 'right'])
 
 current_dir = os.getcwd()
 print(f"current_dir:{current_dir}")
@@ -67,12 +75,30 @@ dataFile.write('subject_id,age,gender,block,stage,fixation_onset,fixation_offset
                 'condition,nonword,subject_response,true_response,correct,rt,'
                 'frame_rate,date,\n')
 
-# measure frame rate
-#frame_rate = win.getActualFrameRate()
-#print(f"测得的帧率: {frame_rate} Hz")
+# measure frame rate: every duration of the session plan is a whole number of frames at this rate
+frame_rate = win.getActualFrameRate(nIdentical=20, nMaxFrames=120, nWarmUpFrames=20)
+if frame_rate is None:
+    # unstable measurement: fall back to the nominal refresh rate
+    frame_rate = 75
+print(f"测得的帧率: {frame_rate:.2f} Hz")
+
+def frames(duration):
+    """Duration (s) as a whole number of frames, at least one."""
+    return max(1, int(round(duration * frame_rate)))
 
-# set default frame rate
-frame_rate = 75
+def show_frames(stims, n_frames):
+    """
+    Draw 'stims' on n_frames consecutive flips.
+    Returns (onset, offset): the flip timestamp of the first frame and the
+    time the last frame is replaced (one refresh after its flip).
+    """
+    for frameN in range(n_frames):
+        for stim in stims:
+            stim.draw()
+        flip_time = win.flip()
+        if frameN == 0:
+            onset = flip_time
+    return onset, flip_time + 1.0 / frame_rate
 
 # set experiment components
 left_option = visual.TextStim(win, text='我', height=2.5, font='Microsoft YaHei', pos=(-5, 0), color='white')
@@ -88,13 +114,7 @@ intro1 = f"""欢迎参加本实验！\n
 若您已准备好开启本实验，\n
 <请按空格键继续>"""
 
-intro1 = visual.TextStim(win, 
-                        text=intro1, 
-                        font='Microsoft YaHei', 
-                        pos=(0, 0), 
-                        height=0.8, 
-                        color='white', 
-                        wrapWidth=30)
+intro1 = screens.get(intro1)
 
 intro1.draw()
 win.flip()
@@ -112,13 +132,7 @@ intro2 = f"""第一阶段中，屏幕中央首先会呈现一个注视点，\n
 如“ REUJZ = 我 ”，\n
 <请按空格键继续>"""
 
-intro2 = visual.TextStim(win, 
-                        text=intro2, 
-                        font='Microsoft YaHei', 
-                        pos=(0, 0), 
-                        height=0.8, 
-                        color='white', 
-                        wrapWidth=30)
+intro2 = screens.get(intro2)
 
 intro2.draw()
 win.flip()
@@ -136,13 +150,7 @@ intro3 = f"""本阶段没有时间限制，\n
 请务必认真学习记忆，\n
 <请按空格键继续>"""
 
-intro3 = visual.TextStim(win, 
-                        text=intro3, 
-                        font='Microsoft YaHei', 
-                        pos=(0, 0), 
-                        height=0.8, 
-                        color='white', 
-                        wrapWidth=30)
+intro3 = screens.get(intro3)
 
 intro3.draw()
 win.flip()
@@ -156,13 +164,7 @@ intro4= f"""您将学习12个非词与标签之间的联结，\n
 一共进行五轮展示，\n
 <请按空格键继续>"""
 
-intro4 = visual.TextStim(win, 
-                        text=intro4, 
-                        font='Microsoft YaHei', 
-                        pos=(0, 0), 
-                        height=0.8, 
-                        color='white', 
-                        wrapWidth=30)
+intro4 = screens.get(intro4)
                         
 intro4.draw()
 win.flip()
@@ -195,23 +197,34 @@ def get_balanced_trials(stim_df, n_trials=12):
         print(error_msg)
         raise FileNotFoundError(error_msg)
     
-    file_list = os.listdir(stimuli_folder)
-    print(f"找到 {len(file_list)} 个文件在刺激文件夹中")
-    
-    valid_extensions = ('.png')
     nonword_info = []
-    
-    for file in file_list:
-        if file.lower().endswith(valid_extensions):
-            nonword = os.path.splitext(file)[0]  
-            if len(nonword) >= 3:
-                third_char = nonword[2].upper()
-                if third_char in ('U', 'N'):
-                    nonword_info.append({
-                        'nonword': nonword,
-                        'filename': os.path.join(stimuli_folder, file),  # 存储完整路径
-                        'third_char': third_char
-                    })
+    # 优先读取刺激索引（manifest.csv，由 Exp_target.py 写入），无需遍历文件夹
+    stimulus_index = load_stimulus_index(stimuli_folder)
+    if stimulus_index is not None:
+        print(f"从索引读取 {len(stimulus_index)} 个刺激")
+        for entry in stimulus_index:
+            if entry['condition'] in ('U', 'N'):
+                nonword_info.append({
+                    'nonword': entry['nonword'],
+                    'filename': os.path.join(stimuli_folder, entry['file']),  # 存储完整路径
+                    'third_char': entry['condition']
+                })
+    else:
+        file_list = os.listdir(stimuli_folder)
+        print(f"找到 {len(file_list)} 个文件在刺激文件夹中")
+
+        valid_extensions = ('.png')
+        for file in file_list:
+            if file.lower().endswith(valid_extensions):
+                nonword = os.path.splitext(file)[0]
+                if len(nonword) >= 3:
+                    third_char = nonword[2].upper()
+                    if third_char in ('U', 'N'):
+                        nonword_info.append({
+                            'nonword': nonword,
+                            'filename': os.path.join(stimuli_folder, file),  # 存储完整路径
+                            'third_char': third_char
+                        })
 
     # 按第三个字符分组
     u_files = [info for info in nonword_info if info['third_char'] == 'U']
@@ -278,14 +291,6 @@ fixation_inner = visual.Circle(
     lineColor='black'
 )
     
-# creat image stimulus component
-stim_image = visual.ImageStim(
-    win,
-    image=None,
-    size=(36,20),
-    pos=(0, 0)
-)
-    
 # creat label text component
 label_text = visual.TextStim(
     win,
@@ -298,29 +303,150 @@ label_text = visual.TextStim(
     
 # set exp parameters
 n_blocks = 5
+n_formal_blocks = 12
+trials_per_block = 60
+required_accuracy = 0.9
     
-# set fixation duration
+# set event durations (s); the session plan stores them as whole frames
 fix_duration = 0.5  
+stim_duration = 0.9
+response_timeout = 2.0
+feedback_duration = 0.5
+iti_range = (0.5, 1.5)
     
 # get balanced trials
 selected_trials = get_balanced_trials(stim_df)
+
+# session texture cache: nonword -> ImageStim, filled once here and used by all three stages.
+# PNGs are decoded in a thread pool, the textures are uploaded once; trials only draw.
+stim_specs = {}
+for _, trial in selected_trials.drop_duplicates('nonword').iterrows():
+    # 裁剪后的刺激（Exp_assets.py）按记录的视角大小和位置显示
+    stim_specs[trial['nonword']] = stimulus_display(os.path.join('stimuli', trial['filename']))
+session_stims, timing = preload_image_stims(win, stim_specs)
+print(f"预加载 {len(session_stims)} 个刺激图像，用时 {timing['total_s']:.2f} s "
+      f"(解码 {timing['decode_s']:.2f} s，上传 {timing['upload_s']:.2f} s)")
+log_preload_time(os.path.join('data', 'preload_times.csv'), timing,
+                 script='Exp1_task1', subject_id=expInfo['受试者编号'], date=data.getDateStr())
+
+# pre-rendered screens: every text is laid out here once, trials only draw one texture
+# learning: stimulus + label + fixation point of each nonword
+learning_screens = {}
+for _, trial in selected_trials.drop_duplicates('nonword').iterrows():
+    label_text.text = trial['label']
+    learning_screens[trial['nonword']] = composite_frame(
+        win, [session_stims[trial['nonword']], label_text, fixation_outer, fixation_inner])
+
+# label prompt: fixation point + the two options, keyed by flip_side
+def option_text(text, x):
+    return visual.TextStim(win, text=text, height=2.5, font='Microsoft YaHei', pos=(x, 0), color='white')
+
+option_screens = {
+    False: composite_frame(win, [fixation_outer, fixation_inner, option_text('我', -5), option_text(pronoun, 5)]),
+    True: composite_frame(win, [fixation_outer, fixation_inner, option_text(pronoun, -5), option_text('我', 5)]),
+}
+# feedback: correct / wrong / too slow
+feedback_screens = {1: screens.get("正确！", height=2.5, wrap_width=None, color='green'),
+                    0: screens.get("错误！", height=2.5, wrap_width=None, color='red')}
+too_slow_text = screens.get("太慢！", height=2.5, wrap_width=None, color='red')
+fixation = [fixation_outer, fixation_inner]
+
+def collect_label_response(flip_side, n_frames):
+    """
+    Show the label prompt for up to n_frames, polling the keys once per frame.
+    Returns (label_onset, key_name, key_time, rt); all but label_onset are None without a response.
+    """
+    label_onset = None
+    for frameN in range(n_frames):
+        option_screens[flip_side].draw()
+        if frameN == 0:
+            # the RT clock starts with the flip that shows the prompt
+            label_keys.start_on_flip()
+            label_onset = win.flip()
+        else:
+            win.flip()
+        response = label_keys.poll()
+        if response is not None:
+            key_name, rt, key_time = response
+            return label_onset, key_name, key_time, rt
+    return label_onset, None, None, None
+
+# ————————————————compile the session plan—————————————————————————
+# define function to 'generate formal trials'
+def generate_formal_trials(learned_nonwords, n_trials):
+    """
+    Parameters：
+    'learned_nonwords': list of the learned non-words (dicts of nonword, label, filename)
+    'n_trials': number of trials to generate
+    """
+    # calculate the number of repetitions for each non-word
+    base_repeats = n_trials // len(learned_nonwords)
+    remaining = n_trials % len(learned_nonwords)
+    
+    # create trial list
+    trials = []
+    for _ in range(base_repeats):
+        trials.extend(learned_nonwords)
+    
+    # add remaining trials
+    if remaining > 0:
+        trials.extend(random.sample(learned_nonwords, remaining))
+    
+    # shuffle the order
+    random.shuffle(trials)
+    return trials[:n_trials]
+
+plan_fields = ['stage', 'block', 'trial', 'nonword', 'label', 'flip_side', 'fixation_frames',
+               'stim_frames', 'response_frames', 'feedback_frames', 'iti_frames', 'frame_rate']
+
+def compile_session_plan(selected_trials):
+    """
+    Every trial of the learning and formal stages, drawn once before the session starts.
+    Returns (learning_plan, formal_plan): one list of trial dicts per block, durations in frames.
+    The adaptive test stage depends on the responses and is not part of the plan.
+    """
+    learning_items = selected_trials[['nonword', 'label', 'filename']].to_dict('records')
+    formal_items = selected_trials[['nonword', 'label', 'filename']].drop_duplicates().to_dict('records')
+    
+    learning_plan = []
+    for block in range(n_blocks):
+        learning_plan.append([dict(item, stage='training', block=block, trial=i, flip_side=None,
+                                   fixation_frames=frames(fix_duration), stim_frames=None,
+                                   response_frames=None, feedback_frames=None,
+                                   iti_frames=frames(random.uniform(*iti_range)))
+                              for i, item in enumerate(learning_items)])
+    
+    formal_plan = []
+    for block in range(n_formal_blocks):
+        formal_plan.append([dict(item, stage='formal_test', block=block, trial=i,
+                                 flip_side=random.choice([True, False]),
+                                 fixation_frames=frames(fix_duration), stim_frames=frames(stim_duration),
+                                 response_frames=frames(response_timeout),
+                                 feedback_frames=frames(feedback_duration),
+                                 iti_frames=frames(random.uniform(*iti_range)))
+                            for i, item in enumerate(generate_formal_trials(formal_items, trials_per_block))])
+    return learning_plan, formal_plan
+
+def write_session_plan(path, plan):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=plan_fields, extrasaction='ignore')
+        writer.writeheader()
+        for block in plan:
+            writer.writerows(dict(trial, frame_rate=frame_rate) for trial in block)
+
+learning_plan, formal_plan = compile_session_plan(selected_trials)
+# saved next to the data file, e.g. Exp1_task1_000_plan.csv
+write_session_plan(fileName.replace('.csv', '_plan.csv'), learning_plan + formal_plan)
     
 # ————————————————experiment stage 1—————————————————————————
 # learn nonwords
 for block in range(n_blocks):
-    for _, trial in selected_trials.iterrows():
+    for trial in learning_plan[block]:
         # present fixation point
-        fixation_outer.draw()
-        fixation_inner.draw()
-        win.flip()
-        fixation_onset = core.getTime()
-        core.wait(fix_duration)
-        fixation_offset = core.getTime()
+        fixation_onset, fixation_offset = show_frames(fixation, trial['fixation_frames'])
         
-        # present stimulus
-        image_path = os.path.join('stimuli', trial['filename'])
-        stim_image.image = image_path
-        label_text.text = trial['label']
+        # present stimulus (pre-rendered with its label and the fixation point)
+        learning_screen = learning_screens[trial['nonword']]
         
         # initialize required data records
         stim_onset = None  
@@ -329,56 +455,33 @@ for block in range(n_blocks):
         rt = None
         first_flip = True  
         
-        # clear any previous key responses
-        event.clearEvents()
-        
         while True:
                 
-            # draw stimulus and fixation point
-            stim_image.draw()
-            label_text.draw()
-            fixation_outer.draw()
-            fixation_inner.draw()
+            # draw stimulus, label and fixation point
+            learning_screen.draw()
             
-            # record precise time on first flip
+            # record precise time on first flip; the RT clock starts with it
             if first_flip:
+                space_keys.start_on_flip()
                 stim_onset = win.flip()
                 # print(stim_onset)
                 first_flip = False
             else:
                 win.flip()
             
-            # detect key press
-            keys = event.getKeys(
-                keyList=['space', 'escape'],
-                timeStamped=True
-            )
+            # detect key press (escape quits inside poll)
+            key_response = space_keys.poll()
             
-            if keys:
-                key_name, _ = keys[0]
-                response = core.getTime()
+            if key_response is not None:
+                subject_response, key_rt, response = key_response
                 # print(f'response={response}')
-                
-                if key_name == 'space':
-                    # calculate rt relative to stimulus onset
-                    # convert rt to ms
-                    rt = (response - stim_onset) * 1000 
-                    # print(f'rt={response - stim_onset}')
-                    subject_response = 'space'
-                    stim_offset = core.getTime()  
-                    # print(f'stim_offset={stim_offset}')
-                    break  
-                elif key_name == 'escape':
-                    core.quit()
-        win.flip()
+                # rt relative to the stimulus flip, convert rt to ms
+                rt = key_rt * 1000 
+                break  
         
-        # set ITI
-        ITI_onset = core.getTime()
-        fixation_outer.draw()
-        fixation_inner.draw()
-        win.flip()
-        core.wait(np.random.uniform(0.5,1.5))
-        ITI_offset = core.getTime()
+        # set ITI: its first flip replaces the stimulus
+        ITI_onset, ITI_offset = show_frames(fixation, trial['iti_frames'])
+        stim_offset = ITI_onset
         
         # determine whether the participant's response was correct, '1' represents correct, '0' represents false.
         true_response = 'space'   
@@ -411,24 +514,12 @@ intro5 = f"""您已完成第一阶段的学习,\n
 如果您已理解实验要求，请按“ → ”键继续，\n
 若仍有疑问，请按“ ← ” 键联系主试"""
 
-intro5 = visual.TextStim(win, 
-                        text=intro5, 
-                        font='Microsoft YaHei', 
-                        pos=(0, 0), 
-                        height=0.8, 
-                        color='white', 
-                        wrapWidth=30)
+intro5 = screens.get(intro5)
 
 intro5.draw()
 win.flip()
     
-contact_text = visual.TextStim(win, 
-                              text="请联系主试", 
-                              font='Microsoft YaHei',
-                              pos=(0, 0), 
-                              height=0.8, 
-                              color='white', 
-                              wrapWidth=30)
+contact_text = screens.get("请联系主试")
 
 while True:
     # 等待被试响应
@@ -444,9 +535,7 @@ while True:
         event.waitKeys() 
 
 #——————————————————————— experiment stage 2: run a test trial ——————————————————————#
-# create components
-feedback = visual.TextStim(win, text='', height=2.5, font='Microsoft YaHei', pos=(0, 0), color='white')
-too_slow_text = visual.TextStim(win, text='太慢！', height=2.5, font='Microsoft YaHei', pos=(0, 0), color='red')
+# components: option_screens, feedback_screens and too_slow_text are pre-rendered at session start
 
 # define the function to run a test trial
 def run_test_trial(trial, flip_side, block):
@@ -459,75 +548,26 @@ def run_test_trial(trial, flip_side, block):
     position_map = {}
 
     # present fixation point
-    fixation_outer.draw()
-    fixation_inner.draw()
-    win.flip()
-    fixation_onset = core.getTime()
-    core.wait(fix_duration)
-    fixation_offset = core.getTime()
+    fixation_onset, fixation_offset = show_frames(fixation, frames(fix_duration))
     
     # present nonword stimulus
-    image_path = os.path.join('stimuli', trial['filename'])
-    stim_image = visual.ImageStim(win, image=image_path, size=(36,20), pos=(0, 0))
-    stim_onset = core.getTime() 
-    stim_image.draw()
-    fixation_outer.draw()
-    fixation_inner.draw()
-    win.flip()
-    core.wait(0.9)
-    stim_offset = core.getTime() 
+    stim_image = session_stims[trial['nonword']]
+    stim_onset, stim_offset = show_frames([stim_image] + fixation, frames(stim_duration))
         
     # randomly adjust the position of self and other labels
     flip_side = random.choice([True, False])
     if flip_side:
-        left_option = visual.TextStim(win, text=pronoun, height=2.5, font='Microsoft YaHei', pos=(-5, 0), color='white')
-        right_option = visual.TextStim(win, text='我', height=2.5, font='Microsoft YaHei', pos=(5, 0), color='white')
         position_map = {pronoun: 'left', '我': 'right'}
     else:
-        left_option = visual.TextStim(win, text='我', height=2.5, font='Microsoft YaHei', pos=(-5, 0), color='white')
-        right_option = visual.TextStim(win, text=pronoun, height=2.5, font='Microsoft YaHei', pos=(5, 0), color='white')
         position_map = {'我': 'left', pronoun: 'right'}
 
     
-    # present label prompt
-    fixation_outer.draw()
-    fixation_inner.draw()
-    left_option.draw()
-    right_option.draw()
-    win.flip()
-        
-    # record the start time of response
-    label_onset = core.getTime()
-    # print(f'labelonset{label_onset}')
-    
-    # set timeout duration
-    timeout = 2.0
-    responded = False
-    
-    # clear any previously recorded events
-    event.clearEvents()
-    while (core.getTime() - label_onset) < timeout:
-        keys = event.getKeys(keyList=['left', 'right', 'escape'])
-        if 'escape' in keys:  
-            win.close()
-            core.quit()
-            
-        if keys:
-            # print(f'{keys}')
-            key_name = keys[0]
-            response = core.getTime()
-            # print(f"response={response}")
-            rt_seconds = response - label_onset
-            # calculate rt (convert to ms)
-            rt = rt_seconds * 1000 
-            # print(f"RT (ms): {rt:.1f}")
-            subject_response = key_name
-            responded = True
-            break
-    
-    if not responded:
-        response = None
-        rt = None
+    # present label prompt until a response or the timeout
+    label_onset, subject_response, response, key_rt = collect_label_response(flip_side, frames(response_timeout))
+    if subject_response is not None:
+        # rt relative to the label flip (convert to ms)
+        rt = key_rt * 1000
+        # print(f"RT (ms): {rt:.1f}")
     
     # check if the participant responded correctly,'1' represent correct,'0' represent false
     true_response = position_map[trial['label']]
@@ -535,22 +575,11 @@ def run_test_trial(trial, flip_side, block):
     correct = 1 if subject_response == true_response else 0
     
     # provide feedback
-    if subject_response is None:
-        too_slow_text.draw()
-        core.wait(0.5)
-    else:
-        feedback.setText("正确！" if correct == 1 else "错误！")
-        feedback.color = 'green' if correct == 1 else 'red'
-        feedback.draw()
-    
-    win.flip()
-    core.wait(0.5)
+    feedback = too_slow_text if subject_response is None else feedback_screens[correct]
+    show_frames([feedback], frames(feedback_duration))
         
-    # ITI interval
-    ITI_onset = core.getTime()
-    win.flip()
-    core.wait(np.random.uniform(0.5,1.5))
-    ITI_offset = core.getTime()
+    # ITI interval (blank screen)
+    ITI_onset, ITI_offset = show_frames([], frames(random.uniform(*iti_range)))
     
     # convert Chinese labels to English labels (self/other) when recording data
     condition = 'self' if trial['label'] == '我' else 'other'
@@ -614,13 +643,7 @@ intro6 = f"""您已完成第二阶段的测试，\n
 如果您准备好了，\n
 <请按空格键继续>"""
 
-intro6 = visual.TextStim(win, 
-                        text=intro6, 
-                        font='Microsoft YaHei', 
-                        pos=(0, 0), 
-                        height=0.8, 
-                        color='white', 
-                        wrapWidth=30)
+intro6 = screens.get(intro6)
 
 intro6.draw()
 win.flip()
@@ -631,40 +654,12 @@ if event.getKeys(keyList=["escape"]):
     core.quit()
 
 # ————————————————— experiment stage 3: formal test phase ————————————————
-n_formal_blocks = 12
-trials_per_block = 60
-required_accuracy = 0.9
-
-# creat feedback components
-feedback_text = visual.TextStim(win, text='', color='white', height=2.5, font='Microsoft YaHei')
-too_slow_text = visual.TextStim(win, text='太慢！', color='red', height=2.5, font='Microsoft YaHei')
-
-# define function to 'generate formal trials'
-def generate_formal_trials(learned_trials, n_trials):
-    """
-    Parameters：
-    'learned_trials': trial data used in the learning phase
-    'n_trials': number of trials to generate
-    """
-    # extract learned non-words from the learning phase data
-    learned_nonwords = learned_trials[['nonword', 'label', 'filename']].drop_duplicates()
-    
-    # calculate the number of repetitions for each non-word
-    base_repeats = n_trials // len(learned_nonwords)
-    remaining = n_trials % len(learned_nonwords)
-    
-    # create trial list
-    trials = []
-    for _ in range(base_repeats):
-        trials.extend(learned_nonwords.to_dict('records'))
-    
-    # add remaining trials
-    if remaining > 0:
-        trials.extend(learned_nonwords.sample(remaining).to_dict('records'))
-    
-    # shuffle the order
-    random.shuffle(trials)
-    return trials[:n_trials]
+# rest screen between blocks: static text cached, dynamic fields in a small overlay.
+# each part has 2 lines of height 0.8 (about 1 deg line spacing), so centres at -/+1.2 deg
+# keep the 4 lines apart like the original single screen; the overlay is drawn last
+block_rest = screens.get("您有1分钟的休息时间\n若已准备好进入下一组，请随时按'空格键'继续",
+                         wrap_width=None, pos=(0, -1.2))
+block_progress = visual.TextStim(win, text='', font='Microsoft YaHei', height=0.8, color='white', pos=(0, 1.2))
 
 # —————————————————experiment stage 3: define 'run_formal_trial'—————————————————
 def run_formal_trial(trial, flip_side, block):
@@ -678,78 +673,26 @@ def run_formal_trial(trial, flip_side, block):
     position_map = {}
     
     # present fixation point
-    fixation_outer.draw()
-    fixation_inner.draw()
-    win.flip()
-    fixation_onset = core.getTime()
-    core.wait(fix_duration)
-    fixation_offset = core.getTime()
+    fixation_onset, fixation_offset = show_frames(fixation, trial['fixation_frames'])
         
     # present stimulus
-    image_path = os.path.join('stimuli', trial['filename'])
-    stim_image = visual.ImageStim(win, image=image_path, size=(36,20), pos=(0, 0))
-    stim_onset = core.getTime()
-    stim_image.draw()
-    fixation_outer.draw()
-    fixation_inner.draw()
-    win.flip()
-    core.wait(0.9)
-    stim_offset = core.getTime()
+    stim_image = session_stims[trial['nonword']]
+    stim_onset, stim_offset = show_frames([stim_image] + fixation, trial['stim_frames'])
         
     # randomly adjust the position of 'self' and 'other'
-    left_option = visual.TextStim(win, text='', height=2.5, font='Microsoft YaHei', pos=(-5, 0), color='white')
-    right_option = visual.TextStim(win, text='', height=2.5, font='Microsoft YaHei', pos=(5, 0), color='white')
-    
     if flip_side:
-        left_option.text = pronoun
-        right_option.text = '我'
         position_map['我'] = 'right'
         position_map[pronoun] = 'left'
     else:
-        left_option.text = '我'
-        right_option.text = pronoun
         position_map['我'] = 'left'
         position_map[pronoun] = 'right'
     
-    # display label prompt
-    fixation_outer.draw()
-    fixation_inner.draw()
-    left_option.draw()
-    right_option.draw()
-    win.flip()
-    label_onset = core.getTime()
-        
-    # define timeout control
-    timeout = 2.0
-    responded = False
-    
-    # Clear any events that were previously recorded
-    event.clearEvents()
-    
-    while (core.getTime() - label_onset) < timeout:
-        keys = event.getKeys(keyList=['left', 'right', 'escape'], timeStamped=True)
-        
-        if keys:
-            key_name, _ = keys[0]
-            if key_name == 'escape':
-                win.close()
-                core.quit()
-                
-            response = core.getTime()
-            
-            # compute rt (convert to ms)
-            rt_seconds = response - label_onset
-            
-            rt = rt_seconds * 1000 
-            # print(f"RT (ms): {rt:.1f}")
-            
-            subject_response = key_name
-            responded = True
-            break
-    
-    if not responded:
-        response = None
-        rt = None
+    # display label prompt until a response or the timeout
+    label_onset, subject_response, response, key_rt = collect_label_response(flip_side, trial['response_frames'])
+    if subject_response is not None:
+        # rt relative to the label flip (convert to ms)
+        rt = key_rt * 1000
+        # print(f"RT (ms): {rt:.1f}")
         
     if trial['label'] == '我':
         true_response = position_map['我']
@@ -759,24 +702,11 @@ def run_formal_trial(trial, flip_side, block):
     correct = 1 if subject_response == true_response else 0
     
     # display feedback
-    if subject_response is None:
-        too_slow_text.draw()
-        core.wait(0.5)
-    else:
-        feedback_text.text = "正确！" if correct == 1 else "错误！"
-        feedback_text.color = 'green' if correct == 1 else 'red'
-        feedback_text.draw()
-    
-    win.flip()
-    core.wait(0.5)
+    feedback = too_slow_text if subject_response is None else feedback_screens[correct]
+    show_frames([feedback], trial['feedback_frames'])
         
     # ITI interval
-    ITI_onset = core.getTime()
-    fixation_outer.draw()
-    fixation_inner.draw()
-    win.flip()
-    core.wait(np.random.uniform(0.5,1.5))
-    ITI_offset = core.getTime()
+    ITI_onset, ITI_offset = show_frames(fixation, trial['iti_frames'])
     
     # convert Chinese labels to English labels (self/other) when recording data
     condition = 'self' if trial['label'] == '我' else 'other'
@@ -798,12 +728,10 @@ total_trials = 0
 block_accuracies = []
 
 for block in range(n_formal_blocks):
-    trials = generate_formal_trials(selected_trials, trials_per_block)
     block_correct = 0
     
-    for trial in trials:
-        flip_side = random.choice([True, False])
-        is_correct = run_formal_trial(trial, flip_side, block)
+    for trial in formal_plan[block]:
+        is_correct = run_formal_trial(trial, trial['flip_side'], block)
         total_trials += 1
         if is_correct:
             total_correct += 1
@@ -813,19 +741,15 @@ for block in range(n_formal_blocks):
     block_accuracy = block_correct / trials_per_block
     block_accuracies.append(block_accuracy)
     
-    # present current block's info
-    block_info = visual.TextStim(win,
-        text=f"block {block+1}/{n_formal_blocks} 完成\n正确率: {block_accuracy:.1%}\n"
-        "您有1分钟的休息时间\n若已准备好进入下一组，请随时按'空格键'继续",
-        font='Microsoft YaHei',
-        height=0.8,
-        color='white'
-    )
-    block_info.draw()
+    # present current block's info: block number and accuracy in a small overlay above the cached rest screen
+    block_progress.text = f"block {block+1}/{n_formal_blocks} 完成\n正确率: {block_accuracy:.1%}"
+    block_rest.draw()
+    block_progress.draw()
     win.flip()
     core.wait(0.5)
     # Wait for up to 60 seconds; if the user presses the space key, proceed immediately
-    event.waitKeys(maxWait=60, keyList=['space'])
+    space_keys.start()
+    space_keys.wait(max_wait=60)
 
 # check if the last three blocks all meet the criteria
 required_blocks = 3
@@ -836,12 +760,9 @@ else:
     passed = False
     
 # ——————————————————————— experiment end——————————————————————
-final_message = visual.TextStim(win,
-    text="恭喜完成实验任务！\n请按空格键退出" if passed else "未达到实验通过标准\n请按空格键退出\n联系主试。",
-    font='Microsoft YaHei',
-    height=0.8,
-    color='white',
-)
+final_message = screens.get(
+    "恭喜完成实验任务！\n请按空格键退出" if passed else "未达到实验通过标准\n请按空格键退出\n联系主试。",
+    wrap_width=None)
 
 final_message.draw()
 win.flip()
@@ -14,6 +14,9 @@ import numpy as np
 import pandas as pd
 from collections import defaultdict, OrderedDict
 from psychopy import visual, event, core, data, gui, logging, prefs
+from Exp_assets import stimulus_display
+from Exp_textures import preload_image_stims, log_preload_time, TextScreenCache, composite_frame
+from Exp_response import ResponseCollector
 
 
 # =============================================================
@@ -43,6 +46,8 @@ win = visual.Window(
     color='grey'
 )
 win.setMouseVisible(False)
+# message screens are laid out once and then shown as cached images (Exp_textures.py)
+screens = TextScreenCache(win)
 
 
 # =============================================================
@@ -63,6 +68,8 @@ blocks_per_condition = 6
 
 # 南师大美德刺激仪的反应盒（"3"和"4"）
 target_key = '3'
+# 反应盒按键的时间戳由键盘后端记录（Exp_response.py），RT 从刺激翻转时刻开始计算
+target_keys = ResponseCollector(win, [target_key])
 
 # =============================================================
 #                           定义主要变量
@@ -90,26 +97,21 @@ with open(fileName, 'w') as f:
 # =============================================================
 
 def waitForExptStartTrigger(trigger_key='s', components=None):
-    # 清理键盘残留按键
-    event.clearEvents(eventType='keyboard')
+    # 清理键盘残留按键（ResponseCollector 创建时即清空）
+    trigger = ResponseCollector(win, [trigger_key])
     print(f'正在等待触发按键：{trigger_key}')
     
     # 显示注视点等待trigger信号
-    fixation_objects = components['fixation']
+    fixation_frame = components['fixation_frame']
     while True:
         # 显示注视点
-        for f in fixation_objects:
-            f.draw()
+        fixation_frame.draw()
         win.flip()
         
-        key = event.getKeys()
-        if len(key) > 0:
-            print(f'检测到按键：{key[0]}')
-            if key[0] == trigger_key:
-                print('收到trigger信号，实验即将开始')
-                return
-            elif key[0] == 'escape':
-                core.quit()
+        # 每帧检查一次；按下ESC时 poll 直接退出
+        if trigger.poll() is not None:
+            print('收到trigger信号，实验即将开始')
+            return
 
 
 # =============================================================
@@ -125,7 +127,7 @@ def load_and_preload_stimuli(subject_id):
                 raise ValueError(f"缺失必要列: {col}")
         
         stimuli = []
-        stim_images = {}  # 存储预创建的ImageStim对象
+        stim_specs = {}  # filename -> (图像路径, 大小, 位置)
         
         for _, row in df.iterrows():
             stim = OrderedDict({
@@ -137,22 +139,23 @@ def load_and_preload_stimuli(subject_id):
             })
             stim['group'] = f"{stim['mid_letter']}_{stim['condition']}"
             
-            # 预创建ImageStim对象
-            img_path = os.path.join('stimuli', f"sub-{subject_id}", stim['filename'])
+            # 裁剪后的刺激（Exp_assets.py）按记录的视角大小和位置显示
+            img_path, img_size, img_pos = stimulus_display(
+                os.path.join('stimuli', f"sub-{subject_id}", stim['filename']))
             if os.path.exists(img_path):
-                stim_images[stim['filename']] = visual.ImageStim(
-                    win, 
-                    image=img_path, 
-                    size=(36, 20), 
-                    pos=(0, 0)
-                )
-                print(f"预加载: {stim['filename']}")
+                stim_specs[stim['filename']] = (img_path, img_size, img_pos)
             else:
                 print(f"警告: 图像文件不存在: {img_path}")
             
             stimuli.append(stim)
         
-        print(f"预加载完成，共加载 {len(stim_images)} 个刺激图像")
+        # 预创建ImageStim对象: PNG在线程池中并行读取和解码，只有纹理上传在主线程
+        stim_images, timing = preload_image_stims(win, stim_specs)
+        print(f"预加载完成，共加载 {len(stim_images)} 个刺激图像，"
+              f"用时 {timing['total_s']:.2f} s (解码 {timing['decode_s']:.2f} s，上传 {timing['upload_s']:.2f} s)")
+        log_preload_time(os.path.join('data', 'preload_times.csv'), timing,
+                         script='Exp2_fMRI', subject_id=subject_id, run=expInfo['run'],
+                         date=data.getDateStr())
         return stimuli, stim_images
         
     except Exception as e:
@@ -185,6 +188,18 @@ def init_components(win):
         ]
     }
 
+# =============================================================
+#               合成刺激帧（在trigger之前完成）
+# =============================================================
+def prepare_composite_frames(win, components, stim_images):
+    """
+    每个刺激与注视点合成为一个纹理，注视点单独合成一个纹理，
+    实验循环中每次flip只需一次draw。返回 filename -> 合成帧。
+    """
+    components['fixation_frame'] = composite_frame(win, components['fixation'])
+    return {filename: composite_frame(win, [stim_image] + components['fixation'])
+            for filename, stim_image in stim_images.items()}
+
 # =============================================================
 #                     按ESC键退出
 # =============================================================
@@ -272,13 +287,13 @@ def add_distractors_to_blocks(blocks, groups, distractor_config):
 # =============================================================
 #                     呈现block（按照帧计时）
 # =============================================================
-def present_block_by_frames(win, components, block, condition, trial_counter, experiment_clock, stim_images):
+def present_block_by_frames(win, components, block, condition, trial_counter, experiment_clock, stim_frames):
     frame_count = 0
     trial_list = block['trial_list']
     block_onset = experiment_clock.getTime()
     
-    # 预先准备所有固定对象
-    fixation_objects = components['fixation']
+    # 预先合成的注视点帧
+    fixation_frame = components['fixation_frame']
     
     for i in range(STIMULI_PER_BLOCK):
         if i < len(trial_list):
@@ -287,35 +302,33 @@ def present_block_by_frames(win, components, block, condition, trial_counter, ex
             
             # 所有准备工作在循环外完成
             recorded_condition = 'target' if is_target else condition
-            stim_image = stim_images.get(trial['filename'])
+            stim_frame = stim_frames.get(trial['filename'])
             
-            if stim_image is None:
+            if stim_frame is None:
                 print(f"警告: 未找到预加载的刺激图像: {trial['filename']}")
                 continue
             
             # 干扰刺激的准备工作
             response_key = 'NA'
             response_time = 'NA'
-            if is_target:
-                event.clearEvents()
-                response_clock = core.Clock()
             
             # === 刺激呈现循环：最小化代码 ===
             stim_onset = None
             for frameN in range(STIM_FRAMES):
                 if frameN == 0:
                     stim_onset = experiment_clock.getTime()
+                    if is_target:
+                        # RT 时钟在刺激出现的那次翻转时归零
+                        target_keys.start_on_flip()
                 
-                stim_image.draw()
-                for f in fixation_objects:
-                    f.draw()
+                stim_frame.draw()
                 win.flip()
                 
                 # 最简化的按键检测
                 if is_target and response_key == 'NA':
-                    keys = event.getKeys(keyList=[target_key], timeStamped=response_clock)
-                    if keys:
-                        response_key, response_time = keys[0][0], round(keys[0][1], 4)
+                    response = target_keys.poll()
+                    if response is not None:
+                        response_key, response_time = response[0], round(response[1], 4)
             
             stim_offset = experiment_clock.getTime()
             
@@ -328,8 +341,7 @@ def present_block_by_frames(win, components, block, condition, trial_counter, ex
                     pass
                 else:
                     # 正常显示注视点
-                    for f in fixation_objects:
-                        f.draw()
+                    fixation_frame.draw()
                 win.flip()
             
             fixation_offset = experiment_clock.getTime()
@@ -395,7 +407,7 @@ def generate_blocks(groups):
 # =============================================================
 #                           定义结束语
 # =============================================================
-def show_final_message(win, current_run):
+def final_message_screen(current_run):
     current_run_num = int(current_run)
     
     if current_run_num < 5:  # 不是最后一个run
@@ -403,12 +415,10 @@ def show_final_message(win, current_run):
     else:  # 最后一个run
         text = "恭喜您！\n\n所有实验已完成，\n感谢您的耐心参与！\n\n请保持静止，\n等待实验人员指示。"
     
-    message = visual.TextStim(win, 
-                            text=text, 
-                            color='white', 
-                            height=1.2, 
-                            wrapWidth=25, 
-                            font='Microsoft YaHei')
+    return screens.get(text, height=1.2, wrap_width=25)
+
+def show_final_message(win, current_run):
+    message = final_message_screen(current_run)
     message.draw()
     win.flip()
     core.wait(1.0)    
@@ -425,8 +435,7 @@ def present_null_block_by_frames(win, components, experiment_clock, trial_counte
     for frameN in range(NULL_FRAMES):
         check_exit()  # 每帧检查ESC键
         
-        for f in components['fixation']:
-            f.draw()
+        components['fixation_frame'].draw()
         win.flip()
     
     null_offset = experiment_clock.getTime()
@@ -456,12 +465,7 @@ def present_null_block_by_frames(win, components, experiment_clock, trial_counte
 #                      定义Message函数
 # =============================================================
 def Message(win, text):
-    message = visual.TextStim(win, 
-                            text=text, 
-                            color='white', 
-                            height=1.0, 
-                            wrapWidth=30, 
-                            font='Microsoft YaHei')
+    message = screens.get(text, height=1.0, wrap_width=30)
     message.draw()
     win.flip()
 
@@ -476,10 +480,13 @@ def main():
     
     grouped = group_stimuli(stimuli)
     blocks = generate_blocks(grouped)
+    # 结束语提前渲染，run结束时直接显示
+    final_message_screen(expInfo['run'])
+    # 刺激+注视点合成为单一纹理
+    stim_frames = prepare_composite_frames(win, components, stim_images)
     
     # 显示注视点
-    for f in components['fixation']:
-        f.draw()
+    components['fixation_frame'].draw()
     win.flip()
     waitForExptStartTrigger('s', components)
     
@@ -496,8 +503,8 @@ def main():
             present_null_block_by_frames(win, components, experiment_clock, trial_counter)
             trial_counter += 1
         else:
-            # 传入预加载的刺激图像
-            frame_count = present_block_by_frames(win, components, block, condition, trial_counter, experiment_clock, stim_images)
+            # 传入预先合成的刺激帧
+            frame_count = present_block_by_frames(win, components, block, condition, trial_counter, experiment_clock, stim_frames)
             print(f"Block {condition} 完成，总帧数: {frame_count}")
             trial_counter += len(block['trial_list'])
 
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Right-sized stimulus assets.
+
+The stimuli are full-screen screenshots (1920x1080, or 2940x1912 from a
+HiDPI display) that the experiment scripts show with size=(36, 20) deg,
+and most of each image is uniform grey. crop_stimuli exports every stimulus of a folder:
+1. Crop it to the noise-plus-nonword bounding box (the non-grey pixels).
+2. Resample it to the pixels it covers on the experiment screen (deg2pix).
+3. Write it to <folder>/cropped/ and record its size and position in deg in
+   crop_geometry.csv, with the size and mtime of the screenshot it was cropped from.
+
+stimulus_display() gives the presentation scripts the cropped asset with
+its geometry, so it is drawn at the same visual angle as the screenshot;
+without an export, or when the screenshot was re-rendered after the export,
+it falls back to the screenshot at (36, 20) deg.
+
+Usage:
+    python Exp_assets.py crop ../stimuli/sub-001 ../stimuli/sub-002
+"""
+
+# import libraries
+import argparse
+import csv
+import os
+import numpy as np
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from Exp_io import ImageEncoder
+from Exp_render import deg2pix
+
+# size (deg) at which the experiment scripts show a full-screen stimulus
+display_size = (36, 20)
+cropped_folder = 'cropped'
+geometry_filename = 'crop_geometry.csv'
+geometry_fields = ['file', 'width_deg', 'height_deg', 'x_deg', 'y_deg', 'width_px', 'height_px', 'source_stamp']
+
+# ================== crop one stimulus ==================
+def source_stamp(path):
+    """Size and mtime of a screenshot (one stat, no read): a cropped export is valid while it matches."""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def content_bbox(image, tolerance=2):
+    """(left, top, right, bottom) of the pixels that differ from the screen colour (top-left pixel)."""
+    pixels = np.asarray(image).astype(np.int16)
+    if pixels.ndim == 3:
+        pixels = pixels[..., :3]
+        differs = np.abs(pixels - pixels[0, 0]).max(axis=-1) > tolerance
+    else:
+        differs = np.abs(pixels - pixels[0, 0]) > tolerance
+    rows = np.flatnonzero(differs.any(axis=1))
+    cols = np.flatnonzero(differs.any(axis=0))
+    if len(rows) == 0:
+        return 0, 0, differs.shape[1], differs.shape[0]
+    return cols[0], rows[0], cols[-1] + 1, rows[-1] + 1
+
+def crop_stimulus(image, display_size=display_size, deg2pix=deg2pix):
+    """
+    Crop a full-screen stimulus to its content.
+    Returns (cropped image, geometry): geometry has the size and centre of the crop in deg.
+    """
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+    width, height = image.size
+    left, top, right, bottom = content_bbox(image)
+    width_deg = display_size[0] * (right - left) / width
+    height_deg = display_size[1] * (bottom - top) / height
+    # deg, origin at the screen centre, y up
+    x_deg = display_size[0] * ((left + right) / 2 / width - 0.5)
+    y_deg = display_size[1] * (0.5 - (top + bottom) / 2 / height)
+    crop = image.crop((left, top, right, bottom))
+    shown = (max(1, int(round(width_deg * deg2pix))), max(1, int(round(height_deg * deg2pix))))
+    # only downsample: a crop with fewer pixels than it covers is kept as is
+    if shown[0] < crop.width:
+        crop = crop.resize(shown, Image.BOX)
+    geometry = {'width_deg': width_deg, 'height_deg': height_deg, 'x_deg': x_deg, 'y_deg': y_deg,
+                'width_px': crop.width, 'height_px': crop.height}
+    return crop, geometry
+
+# ================== export a stimulus folder ==================
+def _crop_file(task):
+    path, display_size, deg2pix = task
+    with Image.open(path) as image:
+        return crop_stimulus(image, display_size, deg2pix)
+
+def crop_stimuli(folder, display_size=display_size, deg2pix=deg2pix, workers=4):
+    """Export every PNG of a stimulus folder to <folder>/cropped/ and write crop_geometry.csv."""
+    files = sorted(f for f in os.listdir(folder)
+                   if f.lower().endswith('.png') and not f.startswith('._'))
+    out_dir = os.path.join(folder, cropped_folder)
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = [(os.path.join(folder, f), display_size, deg2pix) for f in files]
+    rows = []
+    # PNG decoding and encoding release the GIL
+    with ThreadPoolExecutor(max_workers=workers) as pool, \
+            ImageEncoder('png', compress_level=1, workers=workers) as encoder:
+        for file, (crop, geometry) in zip(files, pool.map(_crop_file, tasks)):
+            encoder.submit(crop, os.path.join(out_dir, os.path.splitext(file)[0]))
+            rows.append(dict(file=file, source_stamp=source_stamp(os.path.join(folder, file)), **geometry))
+    write_crop_geometry(folder, rows)
+    return rows
+
+def write_crop_geometry(folder, rows):
+    with open(os.path.join(folder, cropped_folder, geometry_filename), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=geometry_fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    load_crop_geometry.cache_clear()
+
+def drop_cropped(folder, files):
+    """Remove the cropped exports of 'files' (re-rendered or deleted screenshots) and their geometry rows."""
+    geometry = load_crop_geometry(folder)
+    files = set(files) & set(geometry)
+    if not files:
+        return
+    for file in files:
+        path = os.path.join(folder, cropped_folder, file)
+        if os.path.exists(path):
+            os.remove(path)
+    write_crop_geometry(folder, [row for file, row in geometry.items() if file not in files])
+
+# ================== presentation ==================
+@lru_cache(maxsize=None)
+def load_crop_geometry(folder):
+    """file -> geometry of the cropped export of a stimulus folder ({} if not exported)."""
+    path = os.path.join(folder, cropped_folder, geometry_filename)
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline='') as f:
+        return {row['file']: row for row in csv.DictReader(f)}
+
+def stimulus_display(path):
+    """
+    (image path, size, pos) for ImageStim: the cropped asset at its size and
+    position in deg, or the full screenshot at display_size when there is no
+    export or the screenshot changed since it was cropped.
+    """
+    folder, file = os.path.split(os.path.normpath(path))
+    geometry = load_crop_geometry(folder).get(file)
+    if geometry is None or geometry.get('source_stamp') != source_stamp(path):
+        return path, display_size, (0, 0)
+    return (os.path.join(folder, cropped_folder, file),
+            (float(geometry['width_deg']), float(geometry['height_deg'])),
+            (float(geometry['x_deg']), float(geometry['y_deg'])))
+
+# ================== command line ==================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stimulus asset utilities.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    crop = subparsers.add_parser('crop', help='export cropped, right-sized stimuli')
+    crop.add_argument('folders', nargs='+', help='stimulus folders, e.g. ../stimuli/sub-001')
+    crop.add_argument('--deg2pix', type=float, default=deg2pix,
+                      help='pixels per degree of the experiment screen')
+    crop.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    if args.command == 'crop':
+        for folder in args.folders:
+            rows = crop_stimuli(folder, deg2pix=args.deg2pix, workers=args.workers)
+            sizes = [Image.open(os.path.join(folder, row['file'])).size for row in rows]
+            full_px = sum(w * h for w, h in sizes)
+            crop_px = sum(row['width_px'] * row['height_px'] for row in rows)
+            print(f"{folder}: {len(rows)} stimuli, {full_px / max(crop_px, 1):.1f}x fewer pixels")
+
+if __name__ == '__main__':
+    main()
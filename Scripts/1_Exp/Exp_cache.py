@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Content-addressed index of the rendered stimuli.
+
+Every stimulus is keyed by a hash of its inputs: the nonword, the background
+(noise descriptor of a bank row, or a hash of the PNG file), its polarity,
+the display layout of Exp_render.py, the font and the renderer. A stimulus
+folder keeps the index in manifest.csv:
+
+    file, nonword, condition, column, background, inverted, background_id, key
+
+Rebuilds only re-render the items whose key changed (stale_stimuli), files
+of items that were dropped are removed, and the experiment scripts read the
+index at session start instead of listing the folder (load_stimulus_index).
+"""
+
+# import libraries
+import csv
+import hashlib
+import os
+from Exp_assets import drop_cropped
+from Exp_noise import bank_descriptor, format_descriptor
+from Exp_render import (resolution, deg2pix, letter_height, x_positions, y_offset, letter_opacity,
+                        bg_size, screen_grey, get_glyph_atlas, letter_font_px)
+
+index_filename = 'manifest.csv'
+index_fields = ['file', 'nonword', 'condition', 'column', 'background', 'inverted',
+                'background_id', 'key']
+
+# ================== stimulus keys ==================
+def bank_background_id(entry):
+    """Id of a noise bank row: its noise descriptor (seed and generation parameters)."""
+    return format_descriptor(bank_descriptor(entry), entry['polarity'] == 'inverted')
+
+def png_background_id(path):
+    """Id of a background PNG: hash of the file content."""
+    with open(path, 'rb') as f:
+        return 'png:' + hashlib.sha1(f.read()).hexdigest()[:16]
+
+def layout_signature(renderer='headless', font_path=None):
+    """Everything about the display that changes the rendered pixels, as one string."""
+    font_file = os.path.basename(get_glyph_atlas(letter_font_px(), font_path).path)
+    return '|'.join(str(value) for value in (
+        renderer, resolution, deg2pix, letter_height, x_positions, y_offset,
+        letter_opacity, bg_size, screen_grey, font_file))
+
+def stimulus_key(nonword, background_id, inverted, layout):
+    text = f"{nonword}|{background_id}|{bool(inverted)}|{layout}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+# ================== index ==================
+def load_stimulus_index(folder):
+    """Index entries of a stimulus folder (list of dicts), or None if there is no index."""
+    path = os.path.join(folder, index_filename)
+    if not os.path.exists(path):
+        return None
+    with open(path, newline='', encoding='utf-8') as f:
+        entries = list(csv.DictReader(f))
+    for entry in entries:
+        entry['inverted'] = entry['inverted'] == 'True'
+    return entries
+
+def stale_stimuli(folder, entries):
+    """Entries whose file is missing or whose key differs from the stored index."""
+    stored = {entry['file']: entry.get('key') for entry in load_stimulus_index(folder) or []}
+    return [entry for entry in entries
+            if stored.get(entry['file']) != entry['key']
+            or not os.path.exists(os.path.join(folder, entry['file']))]
+
+def write_stimulus_index(folder, entries):
+    """
+    Write the index and delete files of previously indexed stimuli that are no longer used.
+    Cropped exports (Exp_assets.py) of deleted or re-rendered stimuli are removed as well.
+    """
+    keys = {entry['file']: entry['key'] for entry in entries}
+    outdated = []
+    for old in load_stimulus_index(folder) or []:
+        path = os.path.join(folder, old['file'])
+        if old['file'] not in keys and os.path.exists(path):
+            os.remove(path)
+        if keys.get(old['file']) != old.get('key'):
+            outdated.append(old['file'])
+    drop_cropped(folder, outdated)
+    with open(os.path.join(folder, index_filename), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=index_fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(entries)
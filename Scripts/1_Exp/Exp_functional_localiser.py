@@ -12,6 +12,8 @@ import numpy as np
 import pandas as pd
 import os
 import random
+from Exp_textures import TextScreenCache
+from Exp_response import ResponseCollector
 
 # =============================================================
 #                           记录被试信息
@@ -39,6 +41,8 @@ win = visual.Window(
     color='grey'
 )
 win.setMouseVisible(False)
+# message screens are laid out once and then shown as cached images (Exp_textures.py)
+screens = TextScreenCache(win)
 
 # =============================================================
 #                           定义主要变量
@@ -93,8 +97,8 @@ def wait_for_trigger(win, trigger_key='s'):
         win: PsychoPy窗口对象
         trigger_key: trigger信号 's'
     """
-    # 清理键盘残留按键
-    event.clearEvents(eventType='keyboard')
+    # 清理键盘残留按键（ResponseCollector 创建时即清空）
+    trigger = ResponseCollector(win, [trigger_key])
     
     while True:
         # 显示注视点
@@ -102,13 +106,10 @@ def wait_for_trigger(win, trigger_key='s'):
         fixation_inner.draw()
         win.flip()
         
-        keys = event.getKeys()
-        if len(keys) > 0:
-            trigger_time = core.getTime()  # 立即记录时间
-            if keys[0] == trigger_key:
-                return trigger_time  # 立即返回触发时间
-            elif keys[0] == 'escape':
-                core.quit()
+        # 每帧检查一次；按下ESC时 poll 直接退出
+        response = trigger.poll()
+        if response is not None:
+            return response[2]  # 按键事件本身的时间戳（core.getTime 时钟）
 
 
 # =============================================================
@@ -142,15 +143,7 @@ def calculate_frames(duration_s, frame_rate=60):
 #                           定义呈现文本函数
 # =============================================================
 def present_message(win, text, duration_frames=None):
-    message = visual.TextStim(
-        win,
-        text=text,
-        pos=(0, 0),
-        font='Microsoft YaHei',
-        height=0.8,
-        color='white',
-        wrapWidth=30
-    )
+    message = screens.get(text)
     if duration_frames:
         for frame in range(duration_frames):
             message.draw()
@@ -282,6 +275,14 @@ def run_experiment(experiment_clock):
 #                          等待MRI触发 + 运行实验
 # =============================================================
 try:
+    # 实验结束消息 - 根据run数显示不同消息，在trigger之前渲染好
+    current_run = int(expInfo['run'])
+    if current_run == 1:
+        end_message = "第一个run结束！"
+    else:
+        end_message = "恭喜您完成本阶段的任务，感谢您的参与！"
+    message = screens.get(end_message)
+
     # 等待MRI触发信号
     ttl_onset = wait_for_trigger(win)
     
@@ -293,23 +294,7 @@ try:
     # 运行实验，传入experiment_clock
     total_blocks = run_experiment(experiment_clock)
     
-    # 实验结束消息 - 根据run数显示不同消息
-    current_run = int(expInfo['run'])
-    if current_run == 1:
-        end_message = "第一个run结束！"
-    else:
-        end_message = "恭喜您完成本阶段的任务，感谢您的参与！"
-    
-    # 显示消息1秒
-    message = visual.TextStim(
-        win,
-        text=end_message,
-        pos=(0, 0),
-        font='Microsoft YaHei',
-        height=0.8,
-        color='white',
-        wrapWidth=30
-    )
+    # 显示结束消息1秒
     message.draw()
     win.flip()
     core.wait(1.0)  # 显示1秒
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Image encoding helpers for the generated experiment materials.
+
+Backends (all lossless, pixel content is bit-identical):
+- 'png': PNG at a chosen compress level (0-9, Pillow default 6)
+- 'npy': raw NumPy array
+- 'bmp': uncompressed bitmap, the fastest lossless option
+
+Encoding runs on a thread pool (zlib and file I/O release the GIL), so it
+overlaps with generating or rendering the next image.
+
+Usage:
+    python Exp_io.py bench --n-images 20
+"""
+
+# import libraries
+import numpy as np
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import tempfile
+import time
+
+# file extension of every backend
+encoder_extensions = {'png': '.png', 'npy': '.npy', 'bmp': '.bmp'}
+
+# ================== encode one image ==================
+def encode_image(image, path_stem, backend='png', compress_level=6):
+    """
+    Write an image (PIL image or uint8 array) to 'path_stem' + backend extension.
+    Returns the written path.
+    """
+    path = path_stem + encoder_extensions[backend]
+    if backend == 'npy':
+        np.save(path, np.asarray(image))
+        return path
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(image)
+    if backend == 'png':
+        image.save(path, compress_level=compress_level)
+    else:
+        image.save(path)
+    return path
+
+def decode_image(path):
+    """Read an image written by encode_image back into a uint8 array."""
+    if path.endswith('.npy'):
+        return np.load(path)
+    with Image.open(path) as image:
+        return np.asarray(image)
+
+# ================== thread pool encoder ==================
+class ImageEncoder:
+    """
+    Encode images in the background:
+
+        with ImageEncoder('png', compress_level=1) as encoder:
+            for ...:
+                encoder.submit(frame, os.path.join(output_folder, name))
+
+    Leaving the block waits for all pending images and re-raises encoding errors.
+    """
+
+    def __init__(self, backend='png', compress_level=6, workers=4):
+        if backend not in encoder_extensions:
+            raise ValueError(f"unknown encoder backend: {backend}")
+        self.backend = backend
+        self.compress_level = compress_level
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._pending = []
+
+    def submit(self, image, path_stem):
+        future = self._pool.submit(encode_image, image, path_stem, self.backend, self.compress_level)
+        self._pending.append(future)
+        return future
+
+    def close(self):
+        try:
+            for future in self._pending:
+                future.result()
+        finally:
+            self._pending = []
+            self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ================== benchmark ==================
+def benchmark_encoders(images, backends=None, workers=4):
+    """
+    Encode 'images' with every backend and report throughput in MB/s of raw
+    pixel data. Every written file is read back and compared with its source.
+    """
+    if backends is None:
+        backends = [('png', 9), ('png', 6), ('png', 1), ('npy', None), ('bmp', None)]
+    raw_mb = sum(np.asarray(image).nbytes for image in images) / 1e6
+    results = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for backend, level in backends:
+            start = time.perf_counter()
+            with ImageEncoder(backend, compress_level=level, workers=workers) as encoder:
+                futures = [encoder.submit(image, os.path.join(out_dir, f"{backend}{level}_{i}"))
+                           for i, image in enumerate(images)]
+            elapsed = time.perf_counter() - start
+            paths = [future.result() for future in futures]
+            identical = all(np.array_equal(decode_image(path), np.asarray(image))
+                            for path, image in zip(paths, images))
+            results.append({'backend': backend if level is None else f"{backend}-{level}",
+                            'mb_per_s': raw_mb / elapsed,
+                            'file_mb': sum(os.path.getsize(path) for path in paths) / 1e6,
+                            'identical': identical})
+    return results
+
+# ================== command line ==================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Image encoder utilities.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    bench = subparsers.add_parser('bench', help='report MB/s of every encoder backend')
+    bench.add_argument('--n-images', type=int, default=20)
+    bench.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        # benchmark on images of the noise bank (imported here, Exp_noise imports this module)
+        from Exp_noise import generate_noise, image_width, image_height, block_size
+        images = list(generate_noise(image_width, image_height, block_size,
+                                     n_images=args.n_images, rng=0))
+        for result in benchmark_encoders(images, workers=args.workers):
+            print(f"{result['backend']:>6}: {result['mb_per_s']:8.1f} MB/s, "
+                  f"{result['file_mb']:7.2f} MB on disk, identical={result['identical']}")
+
+if __name__ == '__main__':
+    main()
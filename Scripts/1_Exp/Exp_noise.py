@@ -10,7 +10,20 @@ Steps in the script:
 1. Generate noise images with a specified block size and random brightness values.
 2. Save the generated noise images to a directory.
 3. Invert the polarity of each noise image while maintaining the average brightness at 128.
-4. Save the inverted polarity noise images to the same directory.
+4. Save the inverted polarity noise images to the same directory
+   (skipped with --no-inverted; the experiment scripts invert at draw time).
+
+Usage:
+    python Exp_noise.py build --n-images 150 --seed 0 --workers 8
+    python Exp_noise.py build --mode spectral --alpha 1 --band 0.5 4
+    python Exp_noise.py build --n-images 150 --no-inverted
+    python Exp_noise.py sweep --sds 30 40 50 --block-degs 0.6 1.2 2.4 --samples 4
+    python Exp_noise.py render noise:1645421708:128:50:60:1000x500 noise.png
+
+Every image gets its own seed derived from the master seed, so a bank built
+with any number of workers is identical. A single image is fully described by
+(seed, mean, SD, block size, size), which is what the bank index and the
+'render' command use.
 
 Requirements:
 - Pillow (PIL) library for image creation and manipulation
@@ -20,8 +33,14 @@ Requirements:
 # import libraries
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
-import random
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import argparse
+import csv
 import os
+import time
+from Exp_io import ImageEncoder, encoder_extensions
 
 # set image size
 image_width, image_height = 1000, 500
@@ -33,50 +52,505 @@ degree_to_pixel = 50
 block_size_in_degrees = 1.2  
 # convert to pixels
 block_size = int(block_size_in_degrees * degree_to_pixel) 
+# default output folder of the noise bank
+noise_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '..', '..', 'Output', '1_Exp_materials', '1_1_Noise')
+# packed bank: uint8 (N, H, W) stack plus an index of name, polarity and seed
+bank_filename = 'noise_bank.npy'
+bank_index_filename = 'noise_bank_index.csv'
+# per-image luminance statistics, computed once at generation time
+catalog_filename = 'noise_bank_catalog.npz'
+
 # function to generate noise
-def generate_noise(image_width, image_height, block_size=10):
-    noise_image = np.zeros((image_height, image_width, 3), dtype=np.uint8)
-    for y in range(0, image_height, block_size):
-        for x in range(0, image_width, block_size):
-            # randomly generate the brightness of the noise block (Gaussian distribution, mean=128, std=50)
-            brightness = random.gauss(128, 50)
-            # limit brightness range between 0 and 255
-            brightness = np.clip(brightness, 0, 255) 
-            noise_image[y:y+block_size, x:x+block_size] = [brightness, brightness, brightness]
+def generate_noise(image_width, image_height, block_size=10, n_images=None,
+                   mean=128, sd=50, rgb=False, rng=None):
+    """
+    Generate block-mosaic noise with NumPy.
+
+    The whole block grid is drawn from one Gaussian (mean, sd) call and then
+    upsampled to pixels with np.repeat. Edge blocks that do not fit completely
+    (e.g. 1000x500 with 60 px blocks) are cropped, as in the original loop.
+
+    Parameters:
+    'n_images': None returns a single (H, W) image, an integer returns a (N, H, W) stack
+    'rgb': add a trailing channel axis with 3 identical channels
+    'rng': np.random.Generator or seed; None draws fresh entropy
+    """
+    rng = np.random.default_rng(rng)
+    n = 1 if n_images is None else n_images
+    # number of blocks per row/column, including partial edge blocks
+    n_rows = -(-image_height // block_size)
+    n_cols = -(-image_width // block_size)
+    # randomly generate the brightness of every noise block (Gaussian distribution)
+    blocks = rng.normal(mean, sd, size=(n, n_rows, n_cols))
+    # limit brightness range between 0 and 255
+    blocks = np.clip(blocks, 0, 255).astype(np.uint8)
+    # upsample blocks to pixels and crop the partial edge blocks
+    noise_image = np.repeat(np.repeat(blocks, block_size, axis=1), block_size, axis=2)
+    noise_image = noise_image[:, :image_height, :image_width]
+    if rgb:
+        noise_image = np.repeat(noise_image[..., np.newaxis], 3, axis=-1)
+    if n_images is None:
+        return noise_image[0]
     return noise_image
 
-# function to generate and save noise images
-def save_noise_images(num_images=5): 
-    if not os.path.exists("noise"):
-        os.makedirs("noise")
+# a pass band must lie below the Nyquist frequency of the display
+def check_band(band):
+    low, high = band
+    nyquist = degree_to_pixel / 2
+    if not 0 <= low < high <= nyquist:
+        raise ValueError(f"band must satisfy 0 <= low < high <= {nyquist:g} cycles/degree, got {low:g}-{high:g}")
+
+# function to generate band-limited or 1/f^alpha noise
+def generate_spectral_noise(image_width, image_height, n_images=None, mean=128, sd=50,
+                            alpha=None, band=None, rgb=False, rng=None):
+    """
+    Generate noise with a chosen spatial-frequency structure by shaping the
+    Fourier spectrum of white noise (random phase) with numpy.fft.rfft2.
+
+    Parameters:
+    'alpha': amplitude falls off as 1/f^alpha (1 = pink noise); None keeps a flat spectrum
+    'band': (low, high) pass band in cycles/degree (1 degree = degree_to_pixel pixels)
+    'n_images', 'rgb', 'rng': as in generate_noise
+
+    Every image is standardized to (mean, sd) and clipped to 0-255.
+    Raises ValueError when 'band' is out of range or contains no frequency of the image.
+    """
+    if band is not None:
+        check_band(band)
+    rng = np.random.default_rng(rng)
+    n = 1 if n_images is None else n_images
+    white = rng.standard_normal((n, image_height, image_width))
+    spectrum = np.fft.rfft2(white)
+    # radial spatial frequency of every coefficient (cycles/degree)
+    fy = np.fft.fftfreq(image_height)[:, np.newaxis] * degree_to_pixel
+    fx = np.fft.rfftfreq(image_width)[np.newaxis, :] * degree_to_pixel
+    freq = np.hypot(fx, fy)
+    gain = np.ones_like(freq)
+    if alpha is not None:
+        gain[1:] = freq[1:] ** -alpha
+        gain[0, 1:] = freq[0, 1:] ** -alpha
+    if band is not None:
+        low, high = band
+        gain *= (freq >= low) & (freq <= high)
+    # the mean is set after standardization
+    gain[0, 0] = 0
+    if not gain.any():
+        # nothing to standardize: the SD would be 0
+        raise ValueError(f"band {band[0]:g}-{band[1]:g} cycles/degree contains no frequency "
+                         f"of a {image_width}x{image_height} image")
+    noise = np.fft.irfft2(spectrum * gain, s=(image_height, image_width))
+    # standardize each image to the requested mean and SD
+    noise -= noise.mean(axis=(1, 2), keepdims=True)
+    noise /= noise.std(axis=(1, 2), keepdims=True)
+    noise_image = np.clip(noise * sd + mean, 0, 255).astype(np.uint8)
+    if rgb:
+        noise_image = np.repeat(noise_image[..., np.newaxis], 3, axis=-1)
+    if n_images is None:
+        return noise_image[0]
+    return noise_image
+
+# noise models selectable in the bank builder
+noise_modes = {'block': generate_noise, 'spectral': generate_spectral_noise}
+
+# ================== procedural noise source ==================
+# a noise image is fully described by its seed and generation parameters;
+# block_size 0 marks spectral noise, described by alpha and band instead
+NoiseDescriptor = namedtuple('NoiseDescriptor',
+                             ['seed', 'mean', 'sd', 'block_size', 'width', 'height', 'alpha', 'band'],
+                             defaults=(None, None))
 
-    for i in range(num_images):
-        noise_image = generate_noise(image_width, image_height, block_size)
-        noise_img = Image.fromarray(noise_image)
-        file_path = f"noise/noise_{i+1}.png" 
-        noise_img.save(file_path)
+def make_descriptor(seed, mean=128, sd=50, block_size=block_size,
+                    width=image_width, height=image_height, alpha=None, band=None):
+    if band is not None:
+        band = (float(band[0]), float(band[1]))
+    return NoiseDescriptor(int(seed), mean, sd, int(block_size), int(width), int(height),
+                           alpha, band)
+
+def descriptor_noise_params(descriptor):
+    """(mode, noise_params) that regenerate the described image."""
+    d = descriptor
+    noise_params = {'image_width': d.width, 'image_height': d.height, 'mean': d.mean, 'sd': d.sd}
+    if d.block_size:
+        return 'block', dict(noise_params, block_size=d.block_size)
+    return 'spectral', dict(noise_params, alpha=d.alpha, band=d.band)
+
+def _format_structure(descriptor):
+    # block size in pixels, or 'spectral/<alpha>/<low>-<high>'
+    d = descriptor
+    if d.block_size:
+        return str(d.block_size)
+    alpha = 'none' if d.alpha is None else f"{d.alpha:g}"
+    band = 'none' if d.band is None else f"{d.band[0]:g}-{d.band[1]:g}"
+    return f"spectral/{alpha}/{band}"
+
+def format_descriptor(descriptor, inverted=False):
+    """Compact text form for stimulus logs, e.g. 'noise:1645421708:128:50:60:1000x500'."""
+    polarity = 'inverted' if inverted else 'noise'
+    d = descriptor
+    return f"{polarity}:{d.seed}:{d.mean:g}:{d.sd:g}:{_format_structure(d)}:{d.width}x{d.height}"
+
+def parse_descriptor(text):
+    """Inverse of format_descriptor; returns (descriptor, inverted)."""
+    polarity, seed, mean, sd, structure, size = text.split(':')
+    width, height = size.split('x')
+    block, alpha, band = structure, None, None
+    if structure.startswith('spectral'):
+        _, alpha, band = structure.split('/')
+        block = 0
+        alpha = None if alpha == 'none' else float(alpha)
+        band = None if band == 'none' else band.split('-')
+    descriptor = make_descriptor(seed, float(mean), float(sd), block, width, height, alpha, band)
+    return descriptor, polarity == 'inverted'
+
+@lru_cache(maxsize=64)
+def noise_from_descriptor(descriptor, inverted=False):
+    """
+    Regenerate the exact pixels of a described noise image.
+    The most recent textures are kept in a bounded LRU cache, so the
+    returned arrays are shared and read-only.
+    """
+    if inverted:
+        noise_image = invert_polarity_batch(noise_from_descriptor(descriptor)[np.newaxis])[0]
+    else:
+        mode, noise_params = descriptor_noise_params(descriptor)
+        noise_image = noise_modes[mode](rng=descriptor.seed, **noise_params)
+    noise_image.flags.writeable = False
+    return noise_image
+
+# derive the seed of one image from the master seed
+def derive_seed(master_seed, index):
+    """
+    Each image gets its own seed, derived only from (master_seed, index),
+    so any single image can be reproduced no matter how many workers ran.
+    """
+    seed_seq = np.random.SeedSequence(master_seed, spawn_key=(index,))
+    return int(seed_seq.generate_state(1)[0])
 
 # polarity inversion function, maintaining average brightness at 128
 def invert_polarity(image):
-    noise_array = np.array(image)
-    # get the current average brightness of the image
-    current_mean = np.mean(noise_array)
+    inverted_array = invert_polarity_batch(np.array(image)[np.newaxis])[0]
+    inverted_img = Image.fromarray(inverted_array)
+    return inverted_img
+
+# vectorized polarity inversion over a (N, H, W) or (N, H, W, 3) uint8 stack
+def invert_polarity_batch(noise_stack):
+    image_axes = tuple(range(1, noise_stack.ndim))
     # invert the polarity of each pixel
-    inverted_array = 255 - noise_array
-    # calculate the adjustment factor after inversion to maintain the brightness
-    inverted_mean = np.mean(inverted_array)
+    inverted_stack = 255 - noise_stack
+    # calculate the adjustment of every image after inversion to maintain the brightness
+    inverted_mean = np.mean(inverted_stack, axis=image_axes, dtype=np.float64, keepdims=True)
     adjustment = 128 - inverted_mean
-    inverted_array = np.clip(inverted_array + adjustment, 0, 255)
-    
-    inverted_img = Image.fromarray(inverted_array.astype(np.uint8))
-    return inverted_img
+    inverted_stack = np.clip(inverted_stack + adjustment, 0, 255)
+    return inverted_stack.astype(np.uint8)
+
+# stream (noise, inverted) array pairs straight from the generator
+def iter_noise_pairs(seeds, batch_size=16, mode='block', inverted=True, **noise_params):
+    """
+    Yield one (noise, inverted) pair per seed, without any PNG round-trip.
+    The inversion runs as one array operation per batch of 'batch_size' images.
+    'mode' selects the noise model in noise_modes; inverted=False yields (noise, None).
+    """
+    generate = noise_modes[mode]
+    for start in range(0, len(seeds), batch_size):
+        noise_stack = np.stack([generate(rng=seed, **noise_params)
+                                for seed in seeds[start:start + batch_size]])
+        inverted_stack = invert_polarity_batch(noise_stack) if inverted else [None] * len(noise_stack)
+        for noise_image, inverted_image in zip(noise_stack, inverted_stack):
+            yield noise_image, inverted_image
+
+# worker: generate, invert and save one chunk of the bank
+def _save_noise_chunk(task):
+    indices, seeds, num_images, out_dir, mode, noise_params, encoder_params, inverted = task
+    bank = np.load(os.path.join(out_dir, bank_filename), mmap_mode='r+')
+    pairs = iter_noise_pairs(seeds, batch_size=len(seeds), mode=mode, inverted=inverted, **noise_params)
+    rows = []
+    # encoding runs on threads and overlaps with generating the next pair
+    with ImageEncoder(**encoder_params) as encoder:
+        for index, (noise_image, inverted_image) in zip(indices, pairs):
+            # every image is encoded exactly once
+            encoder.submit(noise_image, os.path.join(out_dir, f"noise_{index}"))
+            bank[index - 1] = noise_image
+            rows.append(index - 1)
+            if inverted:
+                # noise images fill the first half of the packed bank, inverted images the second half
+                encoder.submit(inverted_image, os.path.join(out_dir, f"inverted_noise_{index}"))
+                bank[num_images + index - 1] = inverted_image
+                rows.append(num_images + index - 1)
+    bank.flush()
+    # statistics of the rows this worker wrote, while they are still in memory
+    return rows, image_statistics(bank[rows])
+
+# function to generate and save the noise bank (noise + inverted images)
+# inverted=False writes the noise polarity only: the experiment scripts invert it at draw time
+def save_noise_bank(num_images=150, out_dir=noise_folder, master_seed=0, workers=None,
+                    mean=128, sd=50, block_size=block_size, chunk_size=16,
+                    mode='block', alpha=None, band=None, image_format='png', compress_level=6,
+                    inverted=True):
+    if mode == 'block':
+        template = make_descriptor(0, mean, sd, block_size)
+    else:
+        template = make_descriptor(0, mean, sd, 0, alpha=alpha, band=band)
+        # fail before any file is written: one test image raises the workers' ValueError here
+        generate_spectral_noise(image_width, image_height, alpha=alpha, band=band, rng=0)
+    os.makedirs(out_dir, exist_ok=True)
+    mode, noise_params = descriptor_noise_params(template)
+    # file names start at 1 (noise_1.png ... noise_N.png)
+    indices = list(range(1, num_images + 1))
+    seeds = [derive_seed(master_seed, i) for i in indices]
+    write_bank_index(out_dir, list(zip(indices, seeds)), template, inverted)
+    # allocate the packed bank, the workers write their own rows into it
+    n_rows = 2 * num_images if inverted else num_images
+    np.lib.format.open_memmap(os.path.join(out_dir, bank_filename), mode='w+', dtype=np.uint8,
+                              shape=(n_rows, image_height, image_width))
+    encoder_params = {'backend': image_format, 'compress_level': compress_level, 'workers': 2}
+    tasks = [(indices[i:i + chunk_size], seeds[i:i + chunk_size], num_images, out_dir,
+              mode, noise_params, encoder_params, inverted)
+             for i in range(0, num_images, chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_save_noise_chunk, tasks))
+    write_noise_catalog(out_dir, num_images, results, inverted)
+
+# ================== packed noise bank ==================
+def write_bank_index(out_dir, seeds, template, inverted=True):
+    """
+    Write the bank index; 'seeds' is a list of (image number, seed) and 'template'
+    the NoiseDescriptor shared by all images. Every row holds the generation
+    parameters, so it is a full noise descriptor. inverted=False: noise rows only.
+    """
+    num_images = len(seeds)
+    d = template
+    params = [d.mean, d.sd, d.block_size, d.width, d.height,
+              '' if d.alpha is None else d.alpha,
+              '' if d.band is None else f"{d.band[0]:g}-{d.band[1]:g}"]
+    with open(os.path.join(out_dir, bank_index_filename), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['row', 'name', 'polarity', 'seed', 'mean', 'sd', 'block_size',
+                         'width', 'height', 'alpha', 'band'])
+        for i, seed in seeds:
+            writer.writerow([i - 1, f"noise_{i}", 'noise', seed] + params)
+        if not inverted:
+            return
+        for i, seed in seeds:
+            writer.writerow([num_images + i - 1, f"inverted_noise_{i}", 'inverted', seed] + params)
+
+def load_noise_bank(folder=noise_folder):
+    """
+    Open the packed bank as a read-only memory map.
+    Indexing one row (bank[row]) only pages in that image.
+
+    Returns (bank, index), where index is a list of dicts with row, name, polarity and seed.
+    """
+    bank = np.load(os.path.join(folder, bank_filename), mmap_mode='r')
+    with open(os.path.join(folder, bank_index_filename), newline='') as f:
+        index = list(csv.DictReader(f))
+    for entry in index:
+        for key in ('row', 'seed', 'block_size', 'width', 'height'):
+            entry[key] = int(entry[key])
+        for key in ('mean', 'sd'):
+            entry[key] = float(entry[key])
+        entry['alpha'] = float(entry['alpha']) if entry['alpha'] else None
+        entry['band'] = tuple(float(f) for f in entry['band'].split('-')) if entry['band'] else None
+    return bank, index
+
+def bank_descriptor(entry):
+    """Noise descriptor of one bank index entry (the inverted twin shares its seed)."""
+    return make_descriptor(entry['seed'], entry['mean'], entry['sd'], entry['block_size'],
+                           entry['width'], entry['height'], entry['alpha'], entry['band'])
+
+def has_noise_bank(folder=noise_folder):
+    return (os.path.exists(os.path.join(folder, bank_filename))
+            and os.path.exists(os.path.join(folder, bank_index_filename)))
+
+# ================== noise bank catalog ==================
+def image_statistics(image_stack):
+    """
+    Vectorized luminance statistics of a (N, H, W) uint8 stack:
+    mean, SD, RMS contrast (SD / mean) and a 256-bin histogram per image.
+    """
+    n = len(image_stack)
+    pixels = image_stack.reshape(n, -1)
+    mean = pixels.mean(axis=1, dtype=np.float64)
+    sd = pixels.std(axis=1, dtype=np.float64)
+    # one bincount over all images, every image offset into its own 256 bins
+    offsets = (np.arange(n, dtype=np.int64) * 256)[:, np.newaxis]
+    histogram = np.bincount((pixels + offsets).ravel(), minlength=n * 256).reshape(n, 256)
+    return {'mean': mean, 'sd': sd, 'rms_contrast': sd / mean,
+            'histogram': histogram.astype(np.int32)}
+
+def write_noise_catalog(out_dir, num_images, results, inverted=True):
+    """
+    Assemble the per-chunk statistics of save_noise_bank into the catalog file.
+    Without inverted rows 'pair' is -1: the twin only exists at draw time.
+    """
+    n_rows = 2 * num_images if inverted else num_images
+    rows = np.arange(n_rows)
+    names = [f"noise_{i}" for i in range(1, num_images + 1)]
+    polarity = ['noise'] * num_images
+    if inverted:
+        names += [f"inverted_noise_{i}" for i in range(1, num_images + 1)]
+        polarity += ['inverted'] * num_images
+    catalog = {
+        'row': rows,
+        'name': np.array(names),
+        'polarity': np.array(polarity),
+        # row of the polarity twin (noise_i <-> inverted_noise_i)
+        'pair': (rows + num_images) % n_rows if inverted else np.full(n_rows, -1),
+        'mean': np.zeros(n_rows),
+        'sd': np.zeros(n_rows),
+        'rms_contrast': np.zeros(n_rows),
+        'histogram': np.zeros((n_rows, 256), dtype=np.int32),
+    }
+    for chunk_rows, stats in results:
+        for key, values in stats.items():
+            catalog[key][chunk_rows] = values
+    np.savez(os.path.join(out_dir, catalog_filename), **catalog)
+
+def load_noise_catalog(folder=noise_folder):
+    """
+    Catalog arrays indexed by bank row: name, polarity, pair, mean, sd, rms_contrast, histogram.
+    'pair' is -1 in a bank built without inverted images.
+    """
+    with np.load(os.path.join(folder, catalog_filename)) as catalog:
+        return {key: catalog[key] for key in catalog.files}
+
+def match_backgrounds_by_contrast(catalog, n_pairs, rows=None, rng=None):
+    """
+    Pick 'n_pairs' pairs of bank rows with closely matched RMS contrast, e.g. one
+    background for a U item and one for an N item. Only the catalog is read.
+    'rows' restricts the candidates (e.g. only the noise polarity).
+    Returns two lists of rows, element i of both lists forming one pair.
+    """
+    rng = np.random.default_rng(rng)
+    rows = catalog['row'] if rows is None else np.asarray(rows)
+    # neighbours in contrast order form the candidate pairs
+    order = rows[np.argsort(catalog['rms_contrast'][rows], kind='stable')]
+    candidates = order[:len(order) // 2 * 2].reshape(-1, 2)
+    chosen = candidates[rng.choice(len(candidates), n_pairs, replace=False)]
+    # randomize which member of a pair goes to which group
+    swap = rng.random(n_pairs) < 0.5
+    chosen[swap] = chosen[swap, ::-1]
+    return chosen[:, 0].tolist(), chosen[:, 1].tolist()
+
+# ================== parameter sweep ==================
+# width of the label column and downscale factor of the contact sheet thumbnails
+sweep_label_width = 220
+sweep_thumb_scale = 4
+
+# worker: generate the samples of one (mean, sd, block size) cell
+def _sweep_cell(task):
+    mean, sd, block_deg, seeds = task
+    block_px = int(block_deg * degree_to_pixel)
+    samples = np.stack([generate_noise(image_width, image_height, block_px, mean=mean, sd=sd, rng=seed)
+                        for seed in seeds])
+    pixels = samples.astype(np.float64)
+    measured_mean = pixels.mean()
+    measured_sd = pixels.std()
+    stats = {'mean': mean, 'sd': sd, 'block_deg': block_deg, 'block_px': block_px,
+             'measured_mean': round(measured_mean, 3),
+             'measured_sd': round(measured_sd, 3),
+             'rms_contrast': round(measured_sd / measured_mean, 4),
+             'clipped_fraction': round(np.mean((samples == 0) | (samples == 255)), 4)}
+    thumb_size = (image_width // sweep_thumb_scale, image_height // sweep_thumb_scale)
+    thumbs = [np.array(Image.fromarray(sample).resize(thumb_size, Image.BOX)) for sample in samples]
+    return stats, thumbs
+
+def sweep_noise_params(means, sds, block_degs, n_samples=4, out_dir='.', master_seed=0, workers=None):
+    """
+    Generate 'n_samples' images for every (mean, sd, block_deg) cell in parallel and
+    write a contact sheet (one row per cell) plus a CSV of measured statistics.
+    All cells use the same seeds, so they differ only in their parameters.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    seeds = [derive_seed(master_seed, i) for i in range(1, n_samples + 1)]
+    tasks = [(mean, sd, block_deg, seeds) for mean in means for sd in sds for block_deg in block_degs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_sweep_cell, tasks))
+
+    # contact sheet: label column + one thumbnail per sample
+    thumb_h, thumb_w = results[0][1][0].shape
+    sheet = Image.new('L', (sweep_label_width + n_samples * thumb_w, len(results) * thumb_h), 255)
+    draw = ImageDraw.Draw(sheet)
+    font = ImageFont.load_default()
+    for row, (stats, thumbs) in enumerate(results):
+        for col, thumb in enumerate(thumbs):
+            sheet.paste(Image.fromarray(thumb), (sweep_label_width + col * thumb_w, row * thumb_h))
+        label = (f"mean={stats['mean']:g} sd={stats['sd']:g}\n"
+                 f"block={stats['block_deg']:g} deg ({stats['block_px']} px)\n"
+                 f"measured {stats['measured_mean']:.1f} / {stats['measured_sd']:.1f}\n"
+                 f"RMS contrast {stats['rms_contrast']:.3f}")
+        draw.multiline_text((8, row * thumb_h + 8), label, fill=0, font=font)
+    sheet.save(os.path.join(out_dir, 'noise_sweep.png'))
+
+    with open(os.path.join(out_dir, 'noise_sweep.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0][0]))
+        writer.writeheader()
+        writer.writerows(stats for stats, _ in results)
+    return [stats for stats, _ in results]
+
+# ================== command line ==================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the visual noise bank.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='generate noise and inverted noise images')
+    build.add_argument('--n-images', type=int, default=150,
+                       help='number of noise images (the same number of inverted images is added)')
+    build.add_argument('--seed', type=int, default=0, help='master seed')
+    build.add_argument('--workers', type=int, default=None,
+                       help='number of worker processes (default: number of CPUs)')
+    build.add_argument('--mean', type=float, default=128)
+    build.add_argument('--sd', type=float, default=50)
+    build.add_argument('--block-deg', type=float, default=block_size_in_degrees,
+                       help='block size in degrees (1 degree = %d pixels)' % degree_to_pixel)
+    build.add_argument('--mode', choices=sorted(noise_modes), default='block',
+                       help="'block' mosaic or FFT-shaped 'spectral' noise")
+    build.add_argument('--alpha', type=float, default=None,
+                       help='spectral mode: 1/f^alpha amplitude slope')
+    build.add_argument('--band', type=float, nargs=2, metavar=('LOW', 'HIGH'), default=None,
+                       help='spectral mode: pass band in cycles/degree')
+    build.add_argument('--format', choices=sorted(encoder_extensions), default='png',
+                       help='image file format of the individual images (see Exp_io.py)')
+    build.add_argument('--compress-level', type=int, default=6, help='PNG compress level (0-9)')
+    build.add_argument('--no-inverted', dest='inverted', action='store_false',
+                       help='write the noise polarity only; the scripts invert it at draw time')
+    build.add_argument('--out', default=noise_folder, help='output folder')
+
+    sweep = subparsers.add_parser('sweep', help='preview a grid of noise parameters')
+    sweep.add_argument('--means', type=float, nargs='+', default=[128])
+    sweep.add_argument('--sds', type=float, nargs='+', default=[30, 50])
+    sweep.add_argument('--block-degs', type=float, nargs='+', default=[block_size_in_degrees])
+    sweep.add_argument('--samples', type=int, default=4, help='samples per cell')
+    sweep.add_argument('--seed', type=int, default=0, help='master seed')
+    sweep.add_argument('--workers', type=int, default=None)
+    sweep.add_argument('--out', default='noise_sweep', help='output folder')
+
+    render = subparsers.add_parser('render', help='regenerate one image from its descriptor')
+    render.add_argument('descriptor', help="e.g. 'noise:1645421708:128:50:60:1000x500'")
+    render.add_argument('output', help='output image path')
+    args = parser.parse_args(argv)
 
-# generate and save 5 noise images
-def save_inverted_images():
-    for i in range(5):  
-        noise_img = Image.open(f"noise/noise_{i+1}.png")
-        inverted_img = invert_polarity(noise_img)
-        inverted_img.save(f"noise/inverted_noise_{i+1}.png")  
+    if args.command == 'build':
+        block_px = int(args.block_deg * degree_to_pixel)
+        start = time.perf_counter()
+        save_noise_bank(args.n_images, args.out, args.seed, args.workers,
+                        args.mean, args.sd, block_px,
+                        mode=args.mode, alpha=args.alpha, band=args.band,
+                        image_format=args.format, compress_level=args.compress_level,
+                        inverted=args.inverted)
+        elapsed = time.perf_counter() - start
+        n_total = 2 * args.n_images if args.inverted else args.n_images
+        print(f"{n_total} images written to {os.path.abspath(args.out)} "
+              f"in {elapsed:.2f} s ({n_total / elapsed:.1f} images/s)")
+    elif args.command == 'sweep':
+        start = time.perf_counter()
+        cells = sweep_noise_params(args.means, args.sds, args.block_degs, args.samples,
+                                   args.out, args.seed, args.workers)
+        print(f"{len(cells)} cells written to {os.path.abspath(args.out)} "
+              f"in {time.perf_counter() - start:.2f} s")
+    elif args.command == 'render':
+        descriptor, inverted = parse_descriptor(args.descriptor)
+        Image.fromarray(noise_from_descriptor(descriptor, inverted)).save(args.output)
 
-save_noise_images(num_images=5)
-save_inverted_images()
+if __name__ == '__main__':
+    main()
@@ -12,14 +12,40 @@ Key components:
 3. **Window Initialization**: Creates a PsychoPy window with specified properties.
 4. **Stimulus Generation**: Places nonwords on a noisy background with calculated positions.
 5. **Experiment Loop**: Displays stimuli, captures screenshots, and saves them.
+
+With --headless the stimuli are composed with NumPy/PIL (Exp_render.py) instead,
+without opening a window:
+    python Exp_nonwords.py --headless
+
+The output folder keeps a content-addressed index (manifest.csv, see Exp_cache.py);
+with a fixed --seed, re-running only renders the stimuli whose inputs changed.
 """
 
 # import libraries
 from math import atan, pi
-from psychopy import visual, core, event, monitors
+import argparse
 import os
 import random
+import numpy as np
 import pandas as pd
+from PIL import Image
+from Exp_noise import has_noise_bank, load_noise_bank
+from Exp_io import ImageEncoder
+from Exp_cache import (bank_background_id, png_background_id, layout_signature, stimulus_key,
+                       stale_stimuli, write_stimulus_index)
+from Exp_render import x_positions, bg_size, render_stimulus
+
+parser = argparse.ArgumentParser(description='Generate the nonword stimuli.')
+parser.add_argument('--headless', action='store_true',
+                    help='render with NumPy/PIL instead of a fullscreen PsychoPy window')
+parser.add_argument('--seed', type=int, default=None, help='seed of the background choice')
+parser.add_argument('--stored-inverted', action='store_true',
+                    help='use the stored inverted_noise_* images instead of inverting the noise at draw time')
+args = parser.parse_args()
+random.seed(args.seed)
+if not args.headless:
+    from psychopy import visual, core, event
+    from Exp_textures import BackgroundPool, create_word_stimulus
 
 # ================== visual angle calculation ==================
 # viewing distance
@@ -51,101 +77,142 @@ csv_path = os.path.join(current_dir, 'nonwords.csv')
 df = pd.read_csv(csv_path)
 nonwords = df['nonwords'].tolist()
 
-# ================== initialize psychoPy window ==================
-monitor = monitors.Monitor('testMonitor')
-win = visual.Window(size=[1920, 1080],
-                    allowGUI=True,
-                    monitor='testMonitor',
-                    units='deg',
-                    fullscr=True,
-                    color='grey')
-# hide mouse cursor
-win.setMouseVisible(False)
+# runtime polarity inversion: only noise images are loaded, the inverted
+# background is drawn from the same texture
+# (--stored-inverted uses the stored inverted images; without any, inversion stays at draw time)
+runtime_inversion = not args.stored_inverted
 
 # ================== set Nonword Display Parameters ==================
-
-padding_scale = 2.7
-base_padding = 0.9 
-
-# letter size parameters (degrees)
-letter_height = 5.5 
-letter_width = 3.6   
-spacing = 0.6        
-num_letters = 5
-x_positions = [(i - (num_letters - 1) / 2) * (letter_width + spacing) for i in range(num_letters)]
+# letter size, spacing, x_positions, padding and bg_size are shared with Exp_render.py
 print(x_positions)
 
-# ================== calculate background size ==================
-nonword_width = max(x_positions) - min(x_positions)  
-nonword_height = letter_height
-
-bg_width = nonword_width + 2 * base_padding * padding_scale
-bg_height = nonword_height + 2 * base_padding * padding_scale
-bg_size = (bg_width, bg_height)
-
-# preload background noise images
+# background noise images: only the sources (bank rows or paths) are recorded here,
+# images are read when a background is first chosen
 noise_folder = 'noise'
-noise_images = []
-for filename in os.listdir(noise_folder):
-    if filename.startswith('._'):
-        continue
-    if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-        img_path = os.path.join(noise_folder, filename)
-        img_stim = visual.ImageStim(
-            win=win,
-            image=img_path,
-            units='deg',
-            size=bg_size,
-            pos=(0, 0)
-        )
-        noise_images.append(img_stim)
-
-# ensure output folder exists
-output_folder = 'stimuli'
-os.makedirs(output_folder, exist_ok=True)
-
-# ================== function to create letter stimuli ==================
-def create_letter_stimuli(word):
-    stimuli = []
-    for idx, char in enumerate(word):
-        text = char
-        flip = False
-        y_pos = 0
-        y_offset = 0.2
-        if idx == 2 and char == 'N':
-            text = 'U'
-            flip = True
-            y_pos = y_offset
-        stim = visual.TextStim(
-            win=win,
-            text=text,
-            pos=(x_positions[idx], y_pos),
-            height=letter_height,
-            opacity=0.9,
-            flipVert=flip,
-            alignText='center',
-            anchorHoriz='center',
-            anchorVert='center'
-        )
-        stimuli.append(stim)
-    return stimuli
-
-# ================== main Experiment Loop ================== 
-for trial_word in nonwords:
-    background = random.choice(noise_images)
-    trial_stimuli = create_letter_stimuli(trial_word)
-    
-    win.flip()
-    background.draw()
-    for stim in trial_stimuli:
-        stim.draw()
-    win.flip()
-    
-    screenshot_path = os.path.join(output_folder, f"{trial_word}.png")
-    win.getMovieFrame()
-    win.saveMovieFrames(screenshot_path)
-    
-    core.wait(0.5)
-
-win.close()
-core.quit()
\ No newline at end of file
+if has_noise_bank(noise_folder):
+    # packed bank: open once as a memory map, backgrounds are paged in when chosen
+    noise_bank, bank_index = load_noise_bank(noise_folder)
+    if not runtime_inversion and not any(entry['polarity'] == 'inverted' for entry in bank_index):
+        # noise-only bank (Exp_noise.py build --no-inverted): inverted backgrounds are drawn at runtime
+        print('the noise bank has no inverted images: inverting at draw time')
+        runtime_inversion = True
+    if runtime_inversion:
+        bank_index = [entry for entry in bank_index if entry['polarity'] == 'noise']
+    entry_of_row = {entry['row']: entry for entry in bank_index}
+    noise_sources = list(entry_of_row)
+
+    def load_background(row):
+        return noise_bank[row]
+
+    def background_id(row):
+        return bank_background_id(entry_of_row[row])
+else:
+    noise_sources = []
+    noise_files = [f for f in os.listdir(noise_folder) if not f.startswith('._')]
+    if not runtime_inversion and not any(f.startswith('inverted') for f in noise_files):
+        # noise images only: inverted backgrounds are drawn at runtime
+        print('the noise folder has no inverted images: inverting at draw time')
+        runtime_inversion = True
+    for filename in noise_files:
+        if runtime_inversion and not filename.startswith('noise'):
+            continue
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+            noise_sources.append(os.path.join(noise_folder, filename))
+
+    def load_background(img_path):
+        return np.asarray(Image.open(img_path).convert('L'))
+
+    background_id = png_background_id
+
+def choose_background():
+    """
+    Return (source, inverted); inverted backgrounds are drawn with reversed polarity.
+    The image is only read when the stimulus is rendered, so cached stimuli never load it.
+    """
+    inverted = runtime_inversion and random.random() < 0.5
+    return random.choice(noise_sources), inverted
+
+# ================== content-addressed index ==================
+def stimulus_entries(renderer):
+    """One entry per nonword: file, background and polarity, key = hash of all inputs."""
+    layout = layout_signature(renderer)
+    entries = []
+    for trial_word in nonwords:
+        source, inverted = choose_background()
+        bg_id = background_id(source)
+        entries.append({'file': f'{trial_word}.png',
+                        'nonword': trial_word,
+                        'condition': trial_word[2].upper(),
+                        'column': 'nonwords',
+                        'background': source,
+                        'inverted': inverted,
+                        'background_id': bg_id,
+                        'key': stimulus_key(trial_word, bg_id, inverted, layout)})
+    return entries
+
+# ================== headless rendering ==================
+def render_headless(entries, output_folder):
+    with ImageEncoder('png', compress_level=1) as encoder:
+        for entry in entries:
+            screen = render_stimulus(entry['nonword'], load_background(entry['background']),
+                                     entry['inverted'])
+            encoder.submit(screen, os.path.join(output_folder, entry['nonword']))
+
+# ================== window screenshots ==================
+def render_window(entries, output_folder):
+    # ================== initialize psychoPy window ==================
+    win = visual.Window(size=[1920, 1080],
+                        allowGUI=True,
+                        monitor='testMonitor',
+                        units='deg',
+                        fullscr=True,
+                        color='grey',
+                        useFBO=any(entry['inverted'] for entry in entries))
+    # hide mouse cursor
+    win.setMouseVisible(False)
+    # textures are created on first use; at most 16 stay on the GPU
+    background_pool = BackgroundPool(win, load_background, size=bg_size)
+
+    # ================== main Experiment Loop ==================
+    encoder = ImageEncoder('png', compress_level=1)
+    for entry in entries:
+        trial_word, inverted = entry['nonword'], entry['inverted']
+        background = background_pool.get(entry['background'])
+        trial_stimulus = create_word_stimulus(win, trial_word)
+
+        win.flip()
+        background.draw(inverted)
+        trial_stimulus.draw()
+        win.flip()
+
+        # encode the screenshot in the background (lossless, fast PNG)
+        frame = win.getMovieFrame()
+        win.movieFrames = []
+        encoder.submit(frame, os.path.join(output_folder, trial_word))
+
+        core.wait(0.5)
+
+    encoder.close()
+    background_pool.clear()
+    win.close()
+
+# ================== main ==================
+def main():
+    # ensure output folder exists
+    output_folder = 'stimuli'
+    os.makedirs(output_folder, exist_ok=True)
+
+    entries = stimulus_entries('headless' if args.headless else 'window')
+    # only stimuli whose inputs changed are rendered again
+    stale = stale_stimuli(output_folder, entries)
+    print(f"{len(stale)} of {len(entries)} stimuli to render")
+    if args.headless:
+        render_headless(stale, output_folder)
+    elif stale:
+        render_window(stale, output_folder)
+    write_stimulus_index(output_folder, entries)
+    if not args.headless:
+        core.quit()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Headless stimulus compositor.
+
+Renders the nonword-on-noise stimuli of Exp_nonwords.py / Exp_target.py
+purely with NumPy and PIL, without a PsychoPy window or a GPU:
+1. Place the noise background (bg_size) in the middle of a grey screen.
+2. Draw the five letters at x_positions with letter_height and opacity 0.9;
+   a third-letter N is drawn as a vertically flipped U raised by y_offset.
+3. Return the screen as a (H, W) uint8 array.
+
+Letters are not laid out by the font engine per word: every uppercase letter
+and the flipped U are rasterized once per font size into a GlyphAtlas (cached
+to disk as .npz) and words are composed by blitting the glyph arrays.
+
+The geometry below is shared with Exp_nonwords.py and Exp_target.py.
+"""
+
+# import libraries
+from math import atan, pi
+import os
+import string
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from functools import lru_cache
+from Exp_noise import invert_polarity_batch
+
+# ================== visual angle calculation ==================
+# viewing distance
+D = 57
+# screen width (24 inch)
+S = 32.31
+# screen resolution
+resolution = (1920, 1080)
+# plane calculation, as in Exp_nonwords.py
+alpha = atan((S / 2) / D) * 2 * 180 / pi
+deg2pix = int(resolution[0] / alpha)
+
+# ================== nonword display parameters (deg) ==================
+letter_height = 5.5
+letter_width = 3.6
+spacing = 0.6
+num_letters = 5
+x_positions = [(i - (num_letters - 1) / 2) * (letter_width + spacing) for i in range(num_letters)]
+# a third-letter N is shown as a flipped U, raised by y_offset
+y_offset = 0.2
+letter_opacity = 0.9
+padding_scale = 2.7
+base_padding = 0.9
+
+# ================== background size ==================
+nonword_width = max(x_positions) - min(x_positions)
+nonword_height = letter_height
+bg_width = nonword_width + 2 * base_padding * padding_scale
+bg_height = nonword_height + 2 * base_padding * padding_scale
+bg_size = (bg_width, bg_height)
+
+# PsychoPy 'grey' window colour
+screen_grey = 128
+# TextStim default font (Arial), falling back to a font shipped with Pillow's usual environments
+font_names = ['Arial.ttf', 'arial.ttf', 'DejaVuSans.ttf']
+# default folder of the glyph atlas cache
+glyph_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '..', '..', 'Output', '1_Exp_materials', 'glyph_atlas')
+# glyphs rasterized when the atlas is built; a flipped glyph has the key letter + '_flip'
+atlas_keys = list(string.ascii_uppercase) + ['U_flip']
+
+# ================== letter layout ==================
+def letter_layout(word):
+    """(text, x, y, flip) of every letter in deg, as in create_letter_stimuli."""
+    layout = []
+    for idx, char in enumerate(word):
+        if idx == 2 and char == 'N':
+            layout.append(('U', x_positions[idx], y_offset, True))
+        else:
+            layout.append((char, x_positions[idx], 0, False))
+    return layout
+
+@lru_cache(maxsize=8)
+def load_font(size_px, font_path=None):
+    if font_path is not None:
+        return ImageFont.truetype(font_path, size_px)
+    for name in font_names:
+        try:
+            return ImageFont.truetype(name, size_px)
+        except OSError:
+            continue
+    return ImageFont.load_default(size_px)
+
+# ================== glyph atlas ==================
+class GlyphAtlas:
+    """
+    Pre-rasterized glyphs of one font size.
+
+    Every glyph is a (box, box) uint8 coverage array with the letter centred
+    in it (box = 2 * font_px), so a letter at (cx, cy) pixels is blitted to
+    [cy - box/2, cx - box/2]. Built on first use and cached to disk.
+    """
+
+    def __init__(self, font_px, font_path=None, folder=glyph_folder):
+        self.font = load_font(font_px, font_path)
+        self.box = 2 * font_px
+        font_name = os.path.splitext(os.path.basename(getattr(self.font, 'path', 'default')))[0]
+        self.path = os.path.join(folder, f"glyphs_{font_name}_{font_px}px.npz")
+        if os.path.exists(self.path):
+            with np.load(self.path) as cache:
+                self.glyphs = dict(zip(cache['keys'].tolist(), cache['glyphs']))
+        else:
+            self.glyphs = {key: self._rasterize(key) for key in atlas_keys}
+            os.makedirs(folder, exist_ok=True)
+            np.savez(self.path, keys=np.array(list(self.glyphs)),
+                     glyphs=np.stack(list(self.glyphs.values())))
+
+    def _rasterize(self, key):
+        text, flip = key[0], key.endswith('_flip')
+        glyph = Image.new('L', (self.box, self.box), 0)
+        ImageDraw.Draw(glyph).text((self.box / 2, self.box / 2), text, fill=255,
+                                   font=self.font, anchor='mm')
+        if flip:
+            # flipVert mirrors the letter about its own position
+            glyph = glyph.transpose(Image.FLIP_TOP_BOTTOM)
+        return np.asarray(glyph)
+
+    def glyph(self, text, flip=False):
+        key = text + '_flip' if flip else text
+        if key not in self.glyphs:
+            # characters outside the atlas (e.g. lower case) are added on first use
+            self.glyphs[key] = self._rasterize(key)
+        return self.glyphs[key]
+
+    def compose(self, word, width, height, deg2pix=deg2pix):
+        """Coverage (0-255) of the word on a (height, width) canvas centred on (0, 0) deg."""
+        mask = np.zeros((height, width), dtype=np.uint8)
+        half = self.box // 2
+        for text, x, y, flip in letter_layout(word):
+            # deg (y up, origin at the centre) -> pixels (y down, origin top-left)
+            left = int(round(width / 2 + x * deg2pix)) - half
+            top = int(round(height / 2 - y * deg2pix)) - half
+            glyph = self.glyph(text, flip)
+            # clip the glyph box to the canvas
+            x0, y0 = max(left, 0), max(top, 0)
+            x1, y1 = min(left + self.box, width), min(top + self.box, height)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            region = mask[y0:y1, x0:x1]
+            np.maximum(region, glyph[y0 - top:y1 - top, x0 - left:x1 - left], out=region)
+        return mask
+
+@lru_cache(maxsize=8)
+def get_glyph_atlas(font_px, font_path=None):
+    return GlyphAtlas(font_px, font_path)
+
+def letter_font_px(deg2pix=deg2pix):
+    return int(round(letter_height * deg2pix))
+
+def render_letter_mask(word, font_path=None, resolution=resolution, deg2pix=deg2pix):
+    """Coverage (0-255) of the letters on the screen, as a (H, W) uint8 array."""
+    width, height = resolution
+    atlas = get_glyph_atlas(letter_font_px(deg2pix), font_path)
+    return atlas.compose(word, width, height, deg2pix)
+
+# ================== compose one stimulus ==================
+def render_background(background, inverted=False, resolution=resolution, deg2pix=deg2pix):
+    """Grey screen with the noise background scaled to bg_size in the middle."""
+    width, height = resolution
+    noise_array = np.asarray(background)
+    if noise_array.ndim == 3:
+        noise_array = noise_array[..., 0]
+    if inverted:
+        noise_array = invert_polarity_batch(noise_array[np.newaxis])[0]
+    bg_w = int(round(bg_size[0] * deg2pix))
+    bg_h = int(round(bg_size[1] * deg2pix))
+    # ImageStim draws without interpolation by default
+    scaled = np.asarray(Image.fromarray(noise_array).resize((bg_w, bg_h), Image.NEAREST))
+    screen = np.full((height, width), screen_grey, dtype=np.uint8)
+    left, top = (width - bg_w) // 2, (height - bg_h) // 2
+    screen[top:top + bg_h, left:left + bg_w] = scaled
+    return screen
+
+def render_stimulus(word, background, inverted=False, font_path=None,
+                    resolution=resolution, deg2pix=deg2pix):
+    """
+    Render one stimulus without a window.
+
+    Parameters:
+    'background': (H, W) uint8 noise array (e.g. a row of the packed noise bank)
+    'inverted': draw the background with inverted polarity (Exp_noise.invert_polarity)
+    """
+    screen = render_background(background, inverted, resolution, deg2pix).astype(np.float32)
+    # white letters blended over the background with opacity 0.9
+    coverage = render_letter_mask(word, font_path, resolution, deg2pix).astype(np.float32)
+    alpha_map = letter_opacity * coverage / 255
+    screen += alpha_map * (255 - screen)
+    return np.round(screen).astype(np.uint8)
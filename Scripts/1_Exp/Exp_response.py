@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Timestamped keyboard responses shared by the experiment scripts.
+
+ResponseCollector wraps psychopy.hardware.keyboard.Keyboard. The keyboard
+backend (PsychToolbox, or ioHub) timestamps every key press when it happens,
+not when the script polls for it, so the RT does not depend on how often a
+trial loop looks at the keys:
+- start_on_flip() resets the RT clock at the next win.flip(): RTs are
+  measured from the visual onset of the screen that flip shows.
+- poll() returns the first key press since the start, once per frame in a
+  frame-locked loop.
+- wait() blocks until a key press, sleeping between polls instead of
+  spinning the CPU.
+
+A response is (key name, rt in s, key time); the key time is on the
+core.getTime() clock, like the flip timestamps. The quit key closes the
+window and ends the experiment from any of them.
+"""
+
+# import libraries
+from psychopy import core
+from psychopy.hardware import keyboard
+
+class ResponseCollector:
+    def __init__(self, win, key_list, quit_key='escape'):
+        self.win = win
+        self.key_list = list(key_list)
+        self.quit_key = quit_key
+        self.keyboard = keyboard.Keyboard()
+        self.start()
+
+    # ================== response window ==================
+    def start(self):
+        """Drop earlier key presses and measure RTs from now."""
+        self.keyboard.clearEvents()
+        self.keyboard.clock.reset()
+
+    def start_on_flip(self):
+        """Drop earlier key presses and measure RTs from the next flip."""
+        self.win.callOnFlip(self.start)
+
+    # ================== responses ==================
+    def poll(self):
+        """First key press since the start as (name, rt, key time), or None."""
+        keys = self.keyboard.getKeys(keyList=self.key_list + [self.quit_key], waitRelease=False)
+        if not keys:
+            return None
+        key = keys[0]
+        if key.name == self.quit_key:
+            self.win.close()
+            core.quit()
+        return key.name, key.rt, self.start_time() + key.rt
+
+    def start_time(self):
+        """
+        Time of the last start on the core.getTime() clock. getLastResetTime()
+        is on the raw timebase, core.getTime() and the flip timestamps count
+        from the psychopy import (core.monotonicClock).
+        """
+        return self.keyboard.clock.getLastResetTime() - core.monotonicClock.getLastResetTime()
+
+    def wait(self, max_wait=float('inf'), poll_interval=0.001):
+        """Block until a key press or max_wait (s) since the start; None on timeout."""
+        while self.keyboard.clock.getTime() < max_wait:
+            response = self.poll()
+            if response is not None:
+                return response
+            # sleep instead of spinning the CPU
+            core.wait(poll_interval, hogCPUperiod=0)
+        return None
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Low-level image statistics QA of the stimulus sets.
+
+All stimuli of every sub-XXX folder are loaded into one (N, H, W) stack:
+each image is cropped to its content (Exp_assets.content_bbox; the cropped
+export is used when present) and resampled to a common size. One vectorized
+pass then computes per stimulus:
+- mean luminance (0-1)
+- RMS contrast (SD / mean)
+- edge energy (mean squared luminance gradient)
+- nonword-region contrast (RMS contrast inside the box of the letters)
+
+For every subject the U and N items are compared, and the self and other
+items as well when the Day1 behavior files are given. A subject is flagged
+when the group means of a statistic differ by more than 'threshold'
+(relative to their average).
+
+Usage:
+    python Exp_stimuli_qa.py ../../Output/1_Exp_materials/1_2_Stimuli
+    python Exp_stimuli_qa.py ../stimuli --behavior ../data/behavior --threshold 0.05
+"""
+
+# import libraries
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from Exp_assets import content_bbox, stimulus_display
+from Exp_render import bg_width, bg_height, nonword_width, letter_width, letter_height
+
+# common size (H, W) of the analysis stack, with the aspect ratio of bg_size
+stack_shape = (240, int(round(240 * bg_width / bg_height)))
+statistics = ['mean_luminance', 'rms_contrast', 'edge_energy', 'nonword_contrast']
+
+# ================== load the cohort ==================
+def _load_stimulus(task):
+    path, shape = task
+    with Image.open(stimulus_display(path)[0]) as image:
+        image = image.convert('L')
+        image = image.crop(content_bbox(image))
+        return np.asarray(image.resize((shape[1], shape[0]), Image.BOX))
+
+def load_stimulus_stack(root, shape=stack_shape, workers=8):
+    """
+    Every PNG of every sub-XXX folder under 'root'.
+    Returns (items, stack): a DataFrame of subject, file, nonword, condition and a (N, H, W) uint8 stack.
+    """
+    rows = []
+    for subject in sorted(f for f in os.listdir(root) if f.startswith('sub-')):
+        folder = os.path.join(root, subject)
+        for file in sorted(os.listdir(folder)):
+            if not file.lower().endswith('.png') or file.startswith('._'):
+                continue
+            nonword = os.path.splitext(file)[0]
+            rows.append({'subject': subject, 'file': os.path.join(folder, file),
+                         'nonword': nonword, 'condition': nonword[2].upper()})
+    items = pd.DataFrame(rows)
+    stack = np.empty((len(rows),) + tuple(shape), dtype=np.uint8)
+    # PNG decoding releases the GIL
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, image in enumerate(pool.map(_load_stimulus, [(row['file'], shape) for row in rows])):
+            stack[i] = image
+    return items, stack
+
+# ================== statistics ==================
+def nonword_region(shape):
+    """(top, bottom, left, right) of the letters inside a bg_size crop of 'shape'."""
+    height, width = shape
+    region_w = (nonword_width + letter_width) / bg_width * width
+    region_h = letter_height / bg_height * height
+    left, top = int((width - region_w) / 2), int((height - region_h) / 2)
+    return top, height - top, left, width - left
+
+def stimulus_statistics(stack):
+    """Vectorized statistics of a (N, H, W) uint8 stack, one row per image."""
+    lum = stack.astype(np.float32) / 255
+    mean = lum.mean(axis=(1, 2))
+    sd = lum.std(axis=(1, 2))
+    gx = np.diff(lum, axis=2)[:, :-1, :]
+    gy = np.diff(lum, axis=1)[:, :, :-1]
+    edge_energy = (gx ** 2 + gy ** 2).mean(axis=(1, 2))
+    top, bottom, left, right = nonword_region(stack.shape[1:])
+    region = lum[:, top:bottom, left:right]
+    region_mean = region.mean(axis=(1, 2))
+    nonword_contrast = region.std(axis=(1, 2)) / np.maximum(region_mean, 1e-6)
+    return pd.DataFrame({'mean_luminance': mean,
+                         'rms_contrast': sd / np.maximum(mean, 1e-6),
+                         'edge_energy': edge_energy,
+                         'nonword_contrast': nonword_contrast})
+
+# ================== self / other assignment ==================
+def load_assignments(behavior_folder, subjects):
+    """nonword -> 'self' / 'other' of every subject, from the Day1 files Exp1_task1_XXX.csv."""
+    frames = []
+    for subject in subjects:
+        subj_id = subject[len('sub-'):]
+        for name in (subj_id, subj_id.lstrip('0')):
+            path = os.path.join(behavior_folder, f"Exp1_task1_{name}.csv")
+            if os.path.exists(path):
+                day1 = pd.read_csv(path, usecols=['nonword', 'condition']).drop_duplicates('nonword')
+                frames.append(day1.rename(columns={'condition': 'assignment'}).assign(subject=subject))
+                break
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True)
+
+# ================== group comparison ==================
+def compare_groups(table, group_column, groups, threshold=0.05):
+    """
+    Per subject and statistic: relative difference of the two group means,
+    |a - b| / ((a + b) / 2). Returns one row per subject with a 'flagged' column.
+    """
+    means = table[table[group_column].isin(groups)].groupby(['subject', group_column])[statistics].mean()
+    a = means.xs(groups[0], level=group_column)
+    b = means.xs(groups[1], level=group_column)
+    difference = (a - b).abs() / ((a + b) / 2)
+    difference.columns = [f"{column}_diff" for column in difference.columns]
+    difference['comparison'] = f"{groups[0]}-{groups[1]}"
+    difference['flagged'] = (difference.filter(like='_diff') > threshold).any(axis=1)
+    return difference.reset_index()
+
+def run_qa(root, behavior_folder=None, threshold=0.05, workers=8):
+    items, stack = load_stimulus_stack(root, workers=workers)
+    table = pd.concat([items, stimulus_statistics(stack)], axis=1)
+    summaries = [compare_groups(table, 'condition', ['U', 'N'], threshold)]
+    if behavior_folder is not None:
+        assignments = load_assignments(behavior_folder, table['subject'].unique())
+        if assignments is not None:
+            table = table.merge(assignments, on=['subject', 'nonword'], how='left')
+            summaries.append(compare_groups(table, 'assignment', ['self', 'other'], threshold))
+    return table, pd.concat(summaries, ignore_index=True)
+
+# ================== command line ==================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Luminance and contrast balance QA of the stimulus sets.')
+    parser.add_argument('root', help='folder with the sub-XXX stimulus folders')
+    parser.add_argument('--behavior', default=None,
+                        help='folder with the Day1 files Exp1_task1_XXX.csv (self/other comparison)')
+    parser.add_argument('--threshold', type=float, default=0.05,
+                        help='largest allowed relative difference of the group means')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--out', default='.', help='folder of stimuli_qa_items.csv and stimuli_qa_subjects.csv')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    table, summary = run_qa(args.root, args.behavior, args.threshold, args.workers)
+    elapsed = time.perf_counter() - start
+    os.makedirs(args.out, exist_ok=True)
+    table.to_csv(os.path.join(args.out, 'stimuli_qa_items.csv'), index=False)
+    summary.to_csv(os.path.join(args.out, 'stimuli_qa_subjects.csv'), index=False)
+
+    print(f"{len(table)} stimuli of {table['subject'].nunique()} subjects in {elapsed:.1f} s")
+    flagged = summary[summary['flagged']]
+    for _, row in flagged.iterrows():
+        worst = row.filter(like='_diff').astype(float).idxmax()
+        print(f"FLAG {row['subject']} {row['comparison']}: {worst} = {row[worst]:.3f}")
+    if flagged.empty:
+        print(f"no subject above threshold {args.threshold}")
+
+if __name__ == '__main__':
+    main()
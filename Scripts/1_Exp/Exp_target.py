@@ -1,139 +1,300 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+"""
+为一个被试生成目标刺激（4个N + 4个U非词，叠加在噪声背景上）。
+
+    python Exp_target.py                          # 对话框 + 全屏窗口截图
+    python Exp_target.py --headless --subject 001 # 无窗口，用NumPy/PIL合成（Exp_render.py）
+    python Exp_target.py --subjects 001-099 --workers 8 --seed 1   # 批量，多进程无窗口合成
+
+每个被试文件夹中写入 manifest.csv（所选非词、条件、背景及极性，以及内容哈希 key，见 Exp_cache.py）。
+重新生成时只渲染 key 改变了的刺激（例如同一 --seed 下修改了排版参数或背景）。
+"""
+
 # ================== import libraries ==================
-from math import atan, pi
-from psychopy import visual, event, core, data, gui, monitors
+import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor
 import random
+import numpy as np
 import pandas as pd
+from PIL import Image
+from Exp_noise import (catalog_filename, has_noise_bank, load_noise_bank, load_noise_catalog,
+                       match_backgrounds_by_contrast)
+from Exp_io import ImageEncoder
+from Exp_cache import (bank_background_id, png_background_id, layout_signature, stimulus_key,
+                       stale_stimuli, write_stimulus_index)
+from Exp_render import x_positions, bg_size, render_stimulus
 
-# ================== 被试信息 ==================
-expInfo = {'测试时间': data.getDateStr(),
-            '受试者编号': '000',
-            '性别': ['Male', 'Female']}
-dlg = gui.DlgFromDict(dictionary=expInfo, title='基本信息', fixed=['测试时间'])
-if not dlg.OK:
-    core.quit()
-    
-# set save path (base on the subject id)
-subj_id = expInfo['受试者编号']
-output_folder = os.path.join('..', 'target',f'sub-{subj_id}')
-os.makedirs(output_folder, exist_ok=True)
+parser = argparse.ArgumentParser(description='Generate the target stimuli of one subject.')
+parser.add_argument('--headless', action='store_true',
+                    help='render with NumPy/PIL instead of a fullscreen PsychoPy window')
+parser.add_argument('--subject', default=None, help='subject id (skips the dialog)')
+parser.add_argument('--subjects', default=None,
+                    help="batch mode: subject ids, e.g. '001-099' or '001,005,010' (implies --headless)")
+parser.add_argument('--workers', type=int, default=None, help='worker processes in batch mode')
+parser.add_argument('--seed', default=None, help='master seed; each subject gets its own stream')
+parser.add_argument('--out', default=os.path.join('..', 'target'), help='folder of the sub-XXX folders')
+parser.add_argument('--balance-backgrounds', action='store_true',
+                    help='pair the U and N backgrounds by RMS contrast (needs the noise bank catalog)')
+parser.add_argument('--stored-inverted', action='store_true',
+                    help='use the stored inverted_noise_* images instead of inverting the noise at draw time')
+args = parser.parse_args()
+if args.subjects is not None:
+    args.headless = True
+# psychopy is only needed for the window and for the subject dialog
+if not args.headless or (args.subject is None and args.subjects is None):
+    from psychopy import visual, core, data, gui
+if not args.headless:
+    from Exp_textures import BackgroundPool, create_word_stimulus
 
+# 运行时极性反转: 只使用noise图，inverted背景在绘制时由同一纹理反相得到
+# （--stored-inverted 使用存储的inverted图；噪声库中没有inverted图时仍在绘制时反转）
+runtime_inversion = not args.stored_inverted
+# 若噪声库带有catalog，U与N条件的背景按RMS对比度配对（无需读取图像）
+balance_backgrounds = args.balance_backgrounds
 
-# ================== load nonwords from CSV ==================
+noise_folder = '../noise'
 csv_path = os.path.join('..', 'target.csv')
-df = pd.read_csv(csv_path)
-
-# 按照第三个字母为 n 或 u 分别抽取
-nonwords_n = df[df['sub-099'].str[2].str.lower() == 'n']['sub-099'].tolist()
-nonwords_u = df[df['sub-099'].str[2].str.lower() == 'u']['sub-099'].tolist()
-
-selected_n = random.sample(nonwords_n,4)
-selected_u = random.sample(nonwords_u,4)
-selected_nonwords = selected_n + selected_u
-random.shuffle(selected_nonwords)
-
-# ================== initialize psychoPy window ==================
-monitor = monitors.Monitor('testMonitor')
-win = visual.Window(size=[1920, 1080],
-                    allowGUI=True,
-                    monitor='testMonitor',
-                    units='deg',
-                    fullscr=True,
-                    color='grey')
-
-# hide mouse cursor
-win.setMouseVisible(False)
-
-# ================== set Nonword Display Parameters ==================
-# 设置字母高度、宽度以及字母之间的间隔 (deg)
-letter_height = 5.5
-letter_width = 3.6   
-spacing = 0.6        
-num_letters = 5 
-x_positions = [(i - (num_letters - 1) / 2) * (letter_width + spacing) for i in range(num_letters)]
-print(x_positions)
-padding_scale = 2.7
-base_padding = 0.9
-
-# ================== calculate background size ==================
-# 根据文字区域大小 + 边距计算背景噪声图像应呈现的尺寸
-nonword_width = max(x_positions) - min(x_positions)  
-nonword_height = letter_height
-
-bg_width = nonword_width + 2 * base_padding * padding_scale
-bg_height = nonword_height + 2 * base_padding * padding_scale
-bg_size = (bg_width, bg_height)
 
 # ================== 加载背景图像并分类 ==================
-noise_folder = '../noise'
-noise_images = {'noise': [], 'inverted': []}
-
-for filename in os.listdir(noise_folder):
-    if filename.startswith('._') or not filename.lower().endswith('.png'):
-        continue
-    img_path = os.path.join(noise_folder, filename)
-    stim = visual.ImageStim(win=win, 
-                            image=img_path, 
-                            units='deg', 
-                            size=bg_size, 
-                            pos=(0, 0))
-    if filename.startswith('noise'):
-        noise_images['noise'].append(stim)
-    elif filename.startswith('inverted'):
-        noise_images['inverted'].append(stim)
-
-# 随机选取6个noise和6个inverted背景图
-selected_noise = random.sample(noise_images['noise'],4)
-selected_inverted = random.sample(noise_images['inverted'],4)
-selected_backgrounds = selected_noise + selected_inverted
-random.shuffle(selected_backgrounds)
-
-# ================== function to create letter stimuli ==================
-def create_letter_stimuli(word):
-    stimuli = []
-    for idx, char in enumerate(word):
-        text = char
-        flip = False
-        y_pos = 0
-        y_offset = 0.2
-        # 如果第三个字母为N，则显示为U上下翻转形态
-        if idx == 2 and char == 'N':
-            text = 'U'
-            flip = True
-            y_pos = y_offset
-        stim = visual.TextStim(
-            win=win,
-            text=text,
-            pos=(x_positions[idx], y_pos),
-            height=letter_height,
-            opacity=0.9,
-            flipVert=flip,
-            alignText='center',
-            anchorHoriz='center',
-            anchorVert='center'
-        )
-        stimuli.append(stim)
-    return stimuli
-
-# ================== main Experiment Loop ================== 
-for i, trial_word in enumerate(selected_nonwords):
-    background = selected_backgrounds[i]
-    trial_stimuli = create_letter_stimuli(trial_word)
-
-    win.flip()
-    background.draw()
-    for stim in trial_stimuli:
-        stim.draw()
-    win.flip()
-
-    screenshot_path = os.path.join(output_folder, f"{trial_word}.png")
-    win.getMovieFrame()
-    win.saveMovieFrames(screenshot_path)
-
-    core.wait(0.5)
-
-win.close()
-core.quit()
\ No newline at end of file
+def load_noise_sources(noise_folder):
+    """
+    返回 (noise_sources, noise_catalog, load_background, background_id):
+    noise_sources按极性列出背景（噪声库的行号或PNG路径），load_background把它变为图像，
+    background_id给出它的内容标识（噪声描述符或PNG哈希）。
+    """
+    noise_sources = {'noise': [], 'inverted': []}
+    noise_catalog = None
+    if has_noise_bank(noise_folder):
+        # 打包的噪声库: 只读内存映射，只有被选中的背景图才会从磁盘读入
+        noise_bank, bank_index = load_noise_bank(noise_folder)
+        for entry in bank_index:
+            noise_sources[entry['polarity']].append(entry['row'])
+        if os.path.exists(os.path.join(noise_folder, catalog_filename)):
+            noise_catalog = load_noise_catalog(noise_folder)
+
+        def load_background(row):
+            return noise_bank[row]
+
+        entry_of_row = {entry['row']: entry for entry in bank_index}
+
+        def background_id(row):
+            return bank_background_id(entry_of_row[row])
+    else:
+        for filename in os.listdir(noise_folder):
+            if filename.startswith('._') or not filename.lower().endswith('.png'):
+                continue
+            img_path = os.path.join(noise_folder, filename)
+            if filename.startswith('noise'):
+                noise_sources['noise'].append(img_path)
+            elif filename.startswith('inverted'):
+                noise_sources['inverted'].append(img_path)
+
+        def load_background(img_path):
+            return np.asarray(Image.open(img_path).convert('L'))
+
+        background_id = png_background_id
+    return noise_sources, noise_catalog, load_background, background_id
+
+# ================== 选取非词和背景 ==================
+def subject_column(df, subj_id):
+    """被试自己的列 sub-XXX；target.csv 中没有该列时沿用 sub-099"""
+    column = f'sub-{subj_id}'
+    return column if column in df.columns else 'sub-099'
+
+def select_nonwords(df, column, rng):
+    """按照第三个字母为 n 或 u 分别抽取4个，返回 (selected_n, selected_u, 打乱后的全部非词)"""
+    nonwords_n = df[df[column].str[2].str.lower() == 'n'][column].tolist()
+    nonwords_u = df[df[column].str[2].str.lower() == 'u'][column].tolist()
+
+    selected_n = rng.sample(nonwords_n, 4)
+    selected_u = rng.sample(nonwords_u, 4)
+    selected_nonwords = selected_n + selected_u
+    rng.shuffle(selected_nonwords)
+    return selected_n, selected_u, selected_nonwords
+
+def select_backgrounds(selected_n, selected_u, selected_nonwords, noise_sources, noise_catalog, rng):
+    """随机选取4个noise和4个inverted背景图，按selected_nonwords的顺序返回 (背景, 是否在绘制时反转极性)"""
+    # 只含noise极性的噪声库（Exp_noise.py build --no-inverted）只能在绘制时反转
+    invert_at_draw = runtime_inversion or not noise_sources['inverted']
+    if balance_backgrounds and noise_catalog is not None:
+        # 4对对比度匹配的背景: 每对中一张给U，一张给N；前2对为noise，后2对为inverted
+        rows_u, rows_n = match_backgrounds_by_contrast(noise_catalog, 4, rows=noise_sources['noise'],
+                                                       rng=rng.getrandbits(32))
+        def polarity_of(pair_idx, row):
+            if pair_idx < 2:
+                return (row, False)
+            if invert_at_draw:
+                return (row, True)
+            # 使用catalog中记录的inverted孪生图
+            return (int(noise_catalog['pair'][row]), False)
+        background_of_word = {}
+        for words, rows in ((selected_u, rows_u), (selected_n, rows_n)):
+            order = rng.sample(range(4), 4)
+            for word, pair_idx in zip(words, order):
+                background_of_word[word] = polarity_of(pair_idx, rows[pair_idx])
+        return [background_of_word[word] for word in selected_nonwords]
+
+    if invert_at_draw:
+        # 8张不同的noise图，其中4张在绘制时反转极性
+        selected_sources = rng.sample(noise_sources['noise'], 8)
+        selected = [(source, i >= 4) for i, source in enumerate(selected_sources)]
+    else:
+        selected = ([(source, False) for source in rng.sample(noise_sources['noise'], 4)]
+                    + [(source, False) for source in rng.sample(noise_sources['inverted'], 4)])
+    rng.shuffle(selected)
+    return selected
+
+# ================== 刺激清单（内容寻址） ==================
+def stimulus_entries(selected_nonwords, selected, column, background_id, renderer):
+    """每个刺激一条记录: 文件、非词、条件(N/U)、背景及极性，key为全部输入的哈希"""
+    layout = layout_signature(renderer)
+    entries = []
+    for word, (source, inverted) in zip(selected_nonwords, selected):
+        bg_id = background_id(source)
+        entries.append({'file': f'{word}.png',
+                        'nonword': word,
+                        'condition': word[2].upper(),
+                        'column': column,
+                        'background': source,
+                        'inverted': inverted,
+                        'background_id': bg_id,
+                        'key': stimulus_key(word, bg_id, inverted, layout)})
+    return entries
+
+def plan_subject(subj_id, seed, renderer):
+    """为一个被试选取非词和背景，返回 (entries, load_background)"""
+    rng = subject_rng(seed, subj_id)
+    df = pd.read_csv(csv_path)
+    column = subject_column(df, subj_id)
+    selected_n, selected_u, selected_nonwords = select_nonwords(df, column, rng)
+    noise_sources, noise_catalog, load_background, background_id = load_noise_sources(noise_folder)
+    selected = select_backgrounds(selected_n, selected_u, selected_nonwords,
+                                  noise_sources, noise_catalog, rng)
+    entries = stimulus_entries(selected_nonwords, selected, column, background_id, renderer)
+    return entries, load_background
+
+# ================== 无窗口合成 ==================
+def render_headless(entries, load_background, output_folder):
+    with ImageEncoder('png', compress_level=1) as encoder:
+        for entry in entries:
+            screen = render_stimulus(entry['nonword'], load_background(entry['background']),
+                                     entry['inverted'])
+            encoder.submit(screen, os.path.join(output_folder, entry['nonword']))
+
+# ================== 批量生成（多进程） ==================
+def parse_subjects(text):
+    """'001-003,010' -> ['001', '002', '003', '010']，保留编号的位数"""
+    subjects = []
+    for part in text.split(','):
+        part = part.strip()
+        if '-' in part:
+            first, last = part.split('-')
+            subjects += [str(i).zfill(len(first)) for i in range(int(first), int(last) + 1)]
+        elif part:
+            subjects.append(part)
+    return subjects
+
+def subject_rng(seed, subj_id):
+    """每个被试独立的随机流: 同一 seed 下结果与worker数量和顺序无关"""
+    return random.Random(None if seed is None else f'{seed}-sub-{subj_id}')
+
+def build_subject(task):
+    """
+    生成一个被试的目标刺激和manifest（在worker进程中运行）。
+    返回 (subj_id, 重新渲染的数量)，key未改变的刺激直接沿用。
+    """
+    subj_id, seed, out_dir = task
+    output_folder = os.path.join(out_dir, f'sub-{subj_id}')
+    os.makedirs(output_folder, exist_ok=True)
+    entries, load_background = plan_subject(subj_id, seed, 'headless')
+    stale = stale_stimuli(output_folder, entries)
+    render_headless(stale, load_background, output_folder)
+    write_stimulus_index(output_folder, entries)
+    return subj_id, len(stale)
+
+def build_subjects(subjects, seed=None, out_dir=os.path.join('..', 'target'), workers=None):
+    tasks = [(subj_id, seed, out_dir) for subj_id in subjects]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for subj_id, n_rendered in pool.map(build_subject, tasks):
+            print(f'sub-{subj_id}: {n_rendered} rendered')
+
+# ================== 窗口截图 ==================
+def render_window(entries, load_background, output_folder):
+    # ================== initialize psychoPy window ==================
+    win = visual.Window(size=[1920, 1080],
+                        allowGUI=True,
+                        monitor='testMonitor',
+                        units='deg',
+                        fullscr=True,
+                        color='grey',
+                        useFBO=any(entry['inverted'] for entry in entries))
+
+    # hide mouse cursor
+    win.setMouseVisible(False)
+
+    # textures are created when a background is first drawn
+    background_pool = BackgroundPool(win, load_background, size=bg_size, capacity=len(entries))
+
+    # ================== main Experiment Loop ==================
+    encoder = ImageEncoder('png', compress_level=1)
+    for entry in entries:
+        trial_word, inverted = entry['nonword'], entry['inverted']
+        background = background_pool.get(entry['background'])
+        trial_stimulus = create_word_stimulus(win, trial_word)
+
+        win.flip()
+        background.draw(inverted)
+        trial_stimulus.draw()
+        win.flip()
+
+        # encode the screenshot in the background (lossless, fast PNG)
+        frame = win.getMovieFrame()
+        win.movieFrames = []
+        encoder.submit(frame, os.path.join(output_folder, trial_word))
+
+        core.wait(0.5)
+
+    encoder.close()
+    background_pool.clear()
+    win.close()
+
+# ================== 主程序 ==================
+def main():
+    if args.subjects is not None:
+        build_subjects(parse_subjects(args.subjects), args.seed, args.out, args.workers)
+        return
+
+    # ================== 被试信息 ==================
+    if args.subject is not None:
+        subj_id = args.subject
+    else:
+        expInfo = {'测试时间': data.getDateStr(),
+                    '受试者编号': '000',
+                    '性别': ['Male', 'Female']}
+        dlg = gui.DlgFromDict(dictionary=expInfo, title='基本信息', fixed=['测试时间'])
+        if not dlg.OK:
+            core.quit()
+        subj_id = expInfo['受试者编号']
+
+    if args.headless:
+        print(f'sub-{subj_id}: {build_subject((subj_id, args.seed, args.out))[1]} rendered')
+        return
+
+    # set save path (base on the subject id)
+    output_folder = os.path.join(args.out, f'sub-{subj_id}')
+    os.makedirs(output_folder, exist_ok=True)
+
+    # ================== load nonwords from CSV ==================
+    print(x_positions)
+    entries, load_background = plan_subject(subj_id, args.seed, 'window')
+    stale = stale_stimuli(output_folder, entries)
+    if stale:
+        render_window(stale, load_background, output_folder)
+    write_stimulus_index(output_folder, entries)
+    core.quit()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+PsychoPy texture helpers shared by the experiment scripts.
+
+- NoiseBackground: one noise texture that is drawn in either polarity.
+- BackgroundPool: NoiseBackgrounds created on first use, bounded LRU of live textures.
+- preload_image_stims: stimulus PNGs decoded in a thread pool, then uploaded as ImageStims.
+- TextScreenCache: instruction screens laid out once, cached as images on disk.
+- composite_frame: several stimuli flattened into one texture, drawn with a single call.
+- create_word_stimulus: a nonword as one ImageStim blitted from the glyph atlas.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import hashlib
+import os
+import time
+import numpy as np
+from PIL import Image
+from psychopy import visual
+from Exp_render import deg2pix, nonword_width, letter_opacity, get_glyph_atlas, letter_font_px
+from Exp_assets import content_bbox
+
+# default folder of the pre-rendered text screens
+screen_cache_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   '..', '..', 'Output', '1_Exp_materials', 'screen_cache')
+screen_index_fields = ['key', 'x', 'y', 'width', 'height']
+
+
+# ================== noise background with runtime polarity inversion ==================
+class NoiseBackground:
+    """
+    A noise texture that serves both polarities.
+
+    The inverted polarity reproduces Exp_noise.invert_polarity at draw time:
+    the texture is drawn with contrast=-1 (255 - x) and the constant shift that
+    brings the mean back to 128 is added with a uniform rect in 'add' blend mode.
+    The window must be created with useFBO=True for additive blending.
+    """
+
+    def __init__(self, win, image, size, pos=(0, 0), units='deg'):
+        # image: path, PIL image or (H, W) uint8 array
+        if isinstance(image, str):
+            image = Image.open(image)
+        noise_array = np.asarray(image.convert('L') if isinstance(image, Image.Image) else image)
+        self.win = win
+        self.stim = visual.ImageStim(win=win,
+                                     image=Image.fromarray(noise_array),
+                                     units=units,
+                                     size=size,
+                                     pos=pos)
+        # invert_polarity: adjustment = 128 - mean(255 - x), in grey levels
+        adjustment = 128 - (255 - np.mean(noise_array, dtype=np.float64))
+        # grey levels -> signed rgb (-1:1), added on top of the inverted texture
+        shift = adjustment / 127.5
+        self.shift_rect = visual.Rect(win=win,
+                                      width=size[0],
+                                      height=size[1],
+                                      units=units,
+                                      pos=pos,
+                                      fillColor=[shift, shift, shift],
+                                      colorSpace='rgb',
+                                      lineColor=None)
+
+    def draw(self, inverted=False):
+        if not inverted:
+            self.stim.draw()
+            return
+        self.stim.contrast = -1
+        self.stim.draw()
+        self.stim.contrast = 1
+        blend_mode = self.win.blendMode
+        self.win.blendMode = 'add'
+        self.shift_rect.draw()
+        self.win.blendMode = blend_mode
+
+    def release(self):
+        """Free the GL textures now instead of waiting for garbage collection."""
+        self.stim.clearTextures()
+
+
+# ================== lazy LRU pool of noise backgrounds ==================
+class BackgroundPool:
+    """
+    NoiseBackgrounds created when a background is first chosen.
+
+    Only sources (paths or noise bank rows) are kept at start-up; load(source)
+    turns one into an image. At most 'capacity' textures stay on the GPU,
+    the least recently used one is released when a new one is created.
+    """
+
+    def __init__(self, win, load, size, capacity=16, units='deg'):
+        self.win = win
+        self.load = load
+        self.size = size
+        self.capacity = capacity
+        self.units = units
+        self._live = OrderedDict()
+
+    def get(self, source):
+        background = self._live.get(source)
+        if background is not None:
+            self._live.move_to_end(source)
+            return background
+        background = NoiseBackground(self.win, self.load(source), size=self.size, units=self.units)
+        self._live[source] = background
+        while len(self._live) > self.capacity:
+            _, oldest = self._live.popitem(last=False)
+            oldest.release()
+        return background
+
+    def clear(self):
+        for background in self._live.values():
+            background.release()
+        self._live.clear()
+
+
+# ================== nonword from the glyph atlas ==================
+def create_word_stimulus(win, word, pos=(0, 0), units='deg'):
+    """
+    One ImageStim showing the whole nonword (replaces five TextStims).
+
+    The letters are blitted from the pre-rasterized glyph atlas (Exp_render.GlyphAtlas)
+    at x_positions; a third-letter N is the flipped U raised by y_offset.
+    """
+    atlas = get_glyph_atlas(letter_font_px())
+    width = int(np.ceil(nonword_width * deg2pix)) + atlas.box
+    height = atlas.box
+    coverage = atlas.compose(word, width, height)
+    # white letters, coverage as alpha
+    rgba = np.dstack([np.full_like(coverage, 255)] * 3 + [coverage])
+    return visual.ImageStim(win=win,
+                            image=Image.fromarray(rgba, 'RGBA'),
+                            units=units,
+                            size=(width / deg2pix, height / deg2pix),
+                            pos=pos,
+                            opacity=letter_opacity,
+                            interpolate=True)
+
+
+# ================== parallel decode preloader ==================
+def _decode_image(path):
+    with Image.open(path) as image:
+        # reading and PNG decoding release the GIL
+        image.load()
+        return image
+
+def decode_images(paths, workers=8):
+    """path -> decoded PIL image, read and decoded concurrently in a thread pool."""
+    paths = list(dict.fromkeys(paths))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(paths, pool.map(_decode_image, paths)))
+
+def preload_image_stims(win, specs, workers=8, units='deg'):
+    """
+    Preload stimulus images at session start.
+
+    specs: key -> (path, size, pos). All PNGs are decoded in parallel first;
+    only the texture upload (creating the ImageStims) runs on this, the GL, thread.
+    Returns (key -> ImageStim, timing) with timing in seconds.
+    """
+    start = time.perf_counter()
+    images = decode_images([path for path, _, _ in specs.values()], workers)
+    decoded = time.perf_counter()
+    stims = {key: visual.ImageStim(win=win, image=images[path], units=units, size=size, pos=pos)
+             for key, (path, size, pos) in specs.items()}
+    uploaded = time.perf_counter()
+    timing = {'n_images': len(images),
+              'decode_s': decoded - start,
+              'upload_s': uploaded - decoded,
+              'total_s': uploaded - start}
+    return stims, timing
+
+# columns of the preload time log shared by the session scripts
+preload_log_fields = ['date', 'script', 'subject_id', 'run', 'n_images', 'decode_s', 'upload_s', 'total_s']
+
+def log_preload_time(log_path, timing, **info):
+    """Append one session's preload timing (plus script, subject_id, ...) to a CSV log."""
+    row = dict(info, **timing)
+    new_file = not os.path.exists(log_path)
+    os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+    with open(log_path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=preload_log_fields, restval='', extrasaction='ignore')
+        if new_file:
+            writer.writeheader()
+        writer.writerow(row)
+
+
+# ================== pre-rendered text screens ==================
+class TextScreenCache:
+    """
+    Text screens rendered once and shown as images.
+
+    A screen is keyed by (text, font, height, wrapWidth, colour, pos) and the
+    window size and colour. The first time a key is used, the TextStim is laid out once,
+    drawn to the back buffer, cropped to the text and written to the cache
+    folder; afterwards (also in later sessions) the small PNG is shown with
+    an ImageStim and the text is never laid out again. Geometry is kept in
+    'norm' units, so HiDPI captures are drawn at the same place and size.
+    """
+
+    def __init__(self, win, folder=screen_cache_folder):
+        self.win = win
+        self.folder = folder
+        self._index_path = os.path.join(folder, 'screen_index.csv')
+        self._index = {}
+        self._screens = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path, newline='') as f:
+                self._index = {row['key']: row for row in csv.DictReader(f)}
+
+    def key(self, text, font, height, wrap_width, color, pos):
+        monitor = getattr(self.win.monitor, 'name', self.win.monitor)
+        window = (tuple(self.win.size), self.win.units, str(monitor), str(self.win.color))
+        settings = (text, font, height, wrap_width, str(color), tuple(pos), window)
+        return hashlib.sha1(repr(settings).encode('utf-8')).hexdigest()[:20]
+
+    def get(self, text, font='Microsoft YaHei', height=0.8, wrap_width=30, color='white', pos=(0, 0)):
+        """An ImageStim of the screen; draw() it like the TextStim it replaces."""
+        key = self.key(text, font, height, wrap_width, color, pos)
+        screen = self._screens.get(key)
+        if screen is not None:
+            return screen
+        path = os.path.join(self.folder, f"{key}.png")
+        if key not in self._index or not os.path.exists(path):
+            self._render(key, path, visual.TextStim(self.win, text=text, font=font, pos=pos,
+                                                    height=height, color=color, wrapWidth=wrap_width))
+        row = self._index[key]
+        screen = visual.ImageStim(self.win, image=path, units='norm',
+                                  size=(float(row['width']), float(row['height'])),
+                                  pos=(float(row['x']), float(row['y'])))
+        self._screens[key] = screen
+        return screen
+
+    def _render(self, key, path, text_stim):
+        self.win.clearBuffer()
+        text_stim.draw()
+        frame = self.win.getMovieFrame(buffer='back')
+        self.win.movieFrames.pop()
+        self.win.clearBuffer()
+        width, height = frame.size
+        # crop to the text, keeping 2 px of the antialiased edge
+        left, top, right, bottom = content_bbox(frame)
+        left, top = max(left - 2, 0), max(top - 2, 0)
+        right, bottom = min(right + 2, width), min(bottom + 2, height)
+        os.makedirs(self.folder, exist_ok=True)
+        frame.crop((left, top, right, bottom)).save(path)
+        self._index[key] = {'key': key,
+                            'x': (left + right) / width - 1,
+                            'y': 1 - (top + bottom) / height,
+                            'width': 2 * (right - left) / width,
+                            'height': 2 * (bottom - top) / height}
+        with open(self._index_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=screen_index_fields)
+            writer.writeheader()
+            writer.writerows(self._index.values())
+
+
+# ================== composite frames ==================
+def composite_frame(win, stims, margin=2):
+    """
+    Draw 'stims' in order once and capture them as one BufferImageStim,
+    cropped to their joint bounding box (plus 'margin' pixels).
+    Drawing the result is a single textured quad per flip.
+    """
+    try:
+        corners = np.vstack([stim.verticesPix for stim in stims])
+    except AttributeError:
+        # an object without verticesPix (e.g. a wrapper such as NoiseBackground): capture the whole window
+        return visual.BufferImageStim(win, stim=stims)
+    half = np.array(win.size, dtype=float) / 2
+    left, bottom = np.maximum((corners.min(axis=0) - margin) / half, -1)
+    right, top = np.minimum((corners.max(axis=0) + margin) / half, 1)
+    # the crop is drawn at pos (pix), so put it back where its bounding box was captured
+    pos = ((left + right) / 2 * half[0], (top + bottom) / 2 * half[1])
+    return visual.BufferImageStim(win, stim=stims, rect=(left, top, right, bottom), pos=pos)